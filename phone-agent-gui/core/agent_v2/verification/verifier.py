@@ -1,5 +1,6 @@
 """行动验证器 - 检测行动是否生效"""
 
+import re
 from typing import List, Set
 
 from ..types import Action, ActionType, Observation, VerifyResult
@@ -35,6 +36,10 @@ class Verifier:
         "重新登录", "Re-login",
     ]
 
+    # 关键词合并为单个正则，一次扫描替代逐个 in 判断
+    _POPUP_RE = re.compile("|".join(map(re.escape, POPUP_KEYWORDS)))
+    _ERROR_RE = re.compile("|".join(map(re.escape, ERROR_KEYWORDS)))
+
     def verify(
         self,
         before: Observation,
@@ -100,21 +105,19 @@ class Verifier:
 
     def _detect_popup(self, observation: Observation) -> bool:
         """检测是否有弹窗"""
-        for elem in observation.ui_elements:
-            text = elem.text + " " + elem.content_desc
-            for keyword in self.POPUP_KEYWORDS:
-                if keyword in text:
-                    return True
-        return False
+        return self._scan_elements(observation, self._POPUP_RE)
 
     def _detect_error(self, observation: Observation) -> bool:
         """检测是否有错误状态"""
-        for elem in observation.ui_elements:
-            text = elem.text + " " + elem.content_desc
-            for keyword in self.ERROR_KEYWORDS:
-                if keyword in text:
-                    return True
-        return False
+        return self._scan_elements(observation, self._ERROR_RE)
+
+    @staticmethod
+    def _scan_elements(observation: Observation, pattern: re.Pattern) -> bool:
+        """在所有元素的文本/描述中搜索关键词（换行分隔，关键词不会跨元素匹配）"""
+        text = "\n".join(
+            f"{elem.text} {elem.content_desc}" for elem in observation.ui_elements
+        )
+        return pattern.search(text) is not None
 
     def _classify_change(self, changes: List[str], action: Action) -> str:
         """对变化进行分类"""
@@ -223,9 +226,8 @@ class Verifier:
         """查找错误相关的文本"""
         for elem in observation.ui_elements:
             text = elem.text or elem.content_desc
-            for keyword in self.ERROR_KEYWORDS:
-                if keyword in text:
-                    return text[:50]  # 截取前50字符
+            if self._ERROR_RE.search(text):
+                return text[:50]  # 截取前50字符
         return "未知错误"
 
     def _find_new_elements(self, before: Observation, after: Observation) -> List[str]:
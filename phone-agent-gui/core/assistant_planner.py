@@ -2,22 +2,151 @@
 助手规划模块
 封装对话式规划逻辑，支持 Tool Calling，复用 OpenAI/OpenRouter 客户端
 """
+import hashlib
 import json
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import timedelta
 from enum import Enum
-from typing import Any, Callable, Dict, Generator, List, Optional
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
 
 from openai import OpenAI
 
+try:
+    # 可选依赖：orjson 解析速度更快，未安装时回退到标准库
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# markdown 代码块中的 JSON 对象
+_CODE_FENCE_RE = re.compile(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```")
+# 回复中第一个 { 到最后一个 } 之间的内容
+_JSON_OBJECT_RE = re.compile(r"\{[\s\S]*\}")
+
+# 任务分析中执行日志的 token 预算
+_LOG_TOKEN_BUDGET = 1500
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文等非 ASCII 字符约 1 token/字，ASCII 约 4 字符/token"""
+    # UTF-8 下常见中文字符占 3 字节，由字节差推算非 ASCII 字符数
+    non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def _compact_logs(logs: List[str], token_budget: int = _LOG_TOKEN_BUDGET) -> str:
+    """
+    压缩执行日志：合并连续重复行，并在 token 预算内保留最新的完整行
+
+    Args:
+        logs: 执行日志列表
+        token_budget: 保留日志的 token 上限
+
+    Returns:
+        压缩后的日志文本
+    """
+    merged: List[str] = []
+    last_line = None
+    repeat = 0
+    for line in logs:
+        if line == last_line:
+            repeat += 1
+            continue
+        if last_line is not None:
+            merged.append(f"{last_line} (×{repeat})" if repeat > 1 else last_line)
+        last_line, repeat = line, 1
+    if last_line is not None:
+        merged.append(f"{last_line} (×{repeat})" if repeat > 1 else last_line)
+
+    kept: List[str] = []
+    used = 0
+    for line in reversed(merged):
+        cost = _estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            if not kept:
+                # 单行就超出预算时只保留其末尾部分
+                kept.append(line[-token_budget:])
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+    return "\n".join(kept)
+
+
+# 分析结果无法解析时的问题描述（此类结果不进入缓存）
+_PARSE_FAILED_ISSUE = "无法解析分析结果"
+
+# 任务分析的固定指令。放在 system 消息且保持不变，使请求前缀稳定，
+# 便于模型服务端的提示词前缀缓存命中；每次变化的任务信息放在 user 消息中。
+_ANALYSIS_SYSTEM_PROMPT = """你是一个专业的任务执行分析师，擅长分析自动化任务的执行日志，判断任务是否成功完成，识别问题并给出改进建议。
+
+用户会提供一次手机自动化任务的任务信息和执行日志。请判断任务是否真正完成，识别问题并给出改进建议。
 
-@dataclass
+## 请返回 JSON 格式的分析结果
+{
+    "success_judgment": true/false,  // 你判断任务是否真正完成了预期目标
+    "confidence": "高/中/低",  // 判断的置信度
+    "issues_found": ["问题1", "问题2"],  // 发现的问题列表
+    "strategy_suggestions": ["建议1", "建议2"],  // 改进策略建议
+    "summary": "简要总结任务执行情况，2-3句话"
+}
+
+## 分析要点
+1. **成功判断**: 不要只看程序状态，要根据日志判断任务是否真正达成目标
+   - 例如：任务是"浏览10分钟视频"，但只执行了2分钟就结束，应判断为失败
+   - 例如：任务是"发送微信消息"，但遇到登录页面没有完成，应判断为失败
+2. **问题识别**:
+   - 是否遇到登录/验证障碍？
+   - 是否有重复无效的操作？
+   - 是否正确理解了时间要求？
+   - 是否因为超时或步数限制提前结束？
+3. **策略建议**:
+   - 如何优化任务描述使AI更准确理解？
+   - 是否需要调整时间限制或步数限制？
+   - 是否需要预先处理登录问题？
+
+请只返回 JSON，不要添加其他说明。"""
+
+# 结构化计划生成的固定指令（同样保持前缀稳定）
+_PLAN_SYSTEM_PROMPT = (
+    "请基于当前对话生成一份结构化执行计划，返回 JSON，字段包括：\n"
+    "task_description: 给执行AI的操作指令（非常重要，请遵循以下规范），\n"
+    "target_devices: 需执行的设备ID列表（可为空数组），\n"
+    "time_requirement: 时间要求/时间窗口（字符串，可为空），\n"
+    "frequency: 执行频率描述（如一次性/每2小时/每天9:00，字符串）。\n\n"
+    "【task_description 编写规范】\n"
+    "1. 这是给另一个AI（PhoneAgent）执行的指令，不是给用户看的\n"
+    "2. 使用祈使句，直接描述操作步骤，如：'打开微信，搜索联系人张三，发送消息：你好'\n"
+    "3. 包含所有具体信息：App名称、搜索关键词、联系人、消息内容等\n"
+    "4. 不要使用'帮你'、'请'、'用户想要'等口语化表达\n"
+    "5. 不要在 task_description 中包含时间/频率信息\n\n"
+    "请只返回 JSON，不要添加额外说明。"
+)
+
+
+def _extract_json_object(raw: str) -> Dict[str, Any]:
+    """从模型回复中提取 JSON 对象，兼容 markdown 代码块包裹和前后多余文字"""
+    match = _CODE_FENCE_RE.search(raw)
+    if match:
+        candidate = match.group(1)
+    else:
+        match = _JSON_OBJECT_RE.search(raw)
+        candidate = match.group(0) if match else raw
+    return _json_loads(candidate)
+
+
+@dataclass(slots=True, frozen=True)
 class StructuredPlan:
     """AI 助手生成的结构化计划"""
 
     task_description: str
-    target_devices: List[str] = field(default_factory=list)
+    target_devices: Tuple[str, ...] = ()
     time_requirement: str = ""
     frequency: str = ""
     raw_text: str = ""
@@ -25,22 +154,22 @@ class StructuredPlan:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "task_description": self.task_description,
-            "target_devices": self.target_devices,
+            "target_devices": list(self.target_devices),
             "time_requirement": self.time_requirement,
             "frequency": self.frequency,
             "raw_text": self.raw_text,
         }
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TaskAnalysisResult:
     """任务执行分析结果"""
     task_description: str = ""
     device_id: str = ""
     success_judgment: bool = False  # AI判断是否成功
     confidence: str = "中"  # 高/中/低
-    issues_found: List[str] = field(default_factory=list)  # 发现的问题
-    strategy_suggestions: List[str] = field(default_factory=list)  # 策略建议
+    issues_found: Tuple[str, ...] = ()  # 发现的问题
+    strategy_suggestions: Tuple[str, ...] = ()  # 策略建议
     summary: str = ""  # 总结
     raw_response: str = ""
 
@@ -50,8 +179,8 @@ class TaskAnalysisResult:
             "device_id": self.device_id,
             "success_judgment": self.success_judgment,
             "confidence": self.confidence,
-            "issues_found": self.issues_found,
-            "strategy_suggestions": self.strategy_suggestions,
+            "issues_found": list(self.issues_found),
+            "strategy_suggestions": list(self.strategy_suggestions),
             "summary": self.summary,
         }
 
@@ -336,6 +465,10 @@ AVAILABLE_TOOLS = [
 class AssistantPlanner:
     """封装对话式规划，支持 Tool Calling，维护历史并输出结构化计划"""
 
+    # 任务分析结果缓存：最多条目数 / 有效期（秒）
+    ANALYSIS_CACHE_SIZE = 256
+    ANALYSIS_CACHE_TTL = 3600
+
     def __init__(self, api_base: str, api_key: str, model: str, require_confirmation: bool = False):
         self.api_base = api_base
         self.api_key = api_key
@@ -345,6 +478,15 @@ class AssistantPlanner:
         self.enable_tools = True
         self.require_confirmation = require_confirmation
 
+        # 相同输入的任务分析直接复用结果（重试、重复执行时避免再次请求模型）
+        self._analysis_cache: "OrderedDict[str, Tuple[float, TaskAnalysisResult]]" = OrderedDict()
+        self._analysis_cache_lock = threading.Lock()
+
+        # 复用同一个客户端（连接池保持长连接），仅在接口配置变化时重建
+        self._client: Optional[OpenAI] = None
+        self._client_config: Optional[Tuple[str, str]] = None
+        self._client_lock = threading.Lock()
+
         self.system_prompt = """你是 Phone Agent 的智能任务执行助手。**收到请求后直接调用工具执行，不要只回复文字！**
 
 ## 最最重要的规则 - 必须遵守！
@@ -471,10 +613,16 @@ class AssistantPlanner:
             self.require_confirmation = require_confirmation
 
     def _get_client(self) -> OpenAI:
-        return OpenAI(
-            base_url=self.api_base,
-            api_key=self.api_key,
-        )
+        config = (self.api_base, self.api_key)
+        with self._client_lock:
+            if self._client is None or self._client_config != config:
+                # 旧客户端可能仍有进行中的请求，不主动关闭，交给垃圾回收
+                self._client = OpenAI(
+                    base_url=self.api_base,
+                    api_key=self.api_key,
+                )
+                self._client_config = config
+            return self._client
 
     def start_session(self):
         """清空会话历史，开始新会话"""
@@ -823,23 +971,8 @@ class AssistantPlanner:
         基于当前对话生成结构化计划
         返回 StructuredPlan，包含任务描述、目标设备、时间窗口/频率
         """
-        prompt = (
-            "请基于当前对话生成一份结构化执行计划，返回 JSON，字段包括：\n"
-            "task_description: 给执行AI的操作指令（非常重要，请遵循以下规范），\n"
-            "target_devices: 需执行的设备ID列表（可为空数组），\n"
-            "time_requirement: 时间要求/时间窗口（字符串，可为空），\n"
-            "frequency: 执行频率描述（如一次性/每2小时/每天9:00，字符串）。\n\n"
-            "【task_description 编写规范】\n"
-            "1. 这是给另一个AI（PhoneAgent）执行的指令，不是给用户看的\n"
-            "2. 使用祈使句，直接描述操作步骤，如：'打开微信，搜索联系人张三，发送消息：你好'\n"
-            "3. 包含所有具体信息：App名称、搜索关键词、联系人、消息内容等\n"
-            "4. 不要使用'帮你'、'请'、'用户想要'等口语化表达\n"
-            "5. 不要在 task_description 中包含时间/频率信息\n\n"
-            "请只返回 JSON，不要添加额外说明。"
-        )
-
         messages = [
-            {"role": "system", "content": prompt},
+            {"role": "system", "content": _PLAN_SYSTEM_PROMPT},
             {"role": "system", "content": self._get_language_hint(None)},
         ]
         if context_messages:
@@ -872,39 +1005,14 @@ class AssistantPlanner:
     ) -> StructuredPlan:
         """将模型输出解析为 StructuredPlan，异常时兜底"""
         try:
-            # 尝试提取 JSON（可能被 markdown 包裹）
-            reply = raw_reply.strip()
-            if reply.startswith("```"):
-                # 移除 markdown 代码块
-                lines = reply.split("\n")
-                json_lines = []
-                in_block = False
-                for line in lines:
-                    if line.strip().startswith("```"):
-                        in_block = not in_block
-                        continue
-                    # 只在代码块内收集内容
-                    if in_block:
-                        json_lines.append(line)
-                reply = "\n".join(json_lines) if json_lines else reply
-
-            # 尝试直接解析，如果失败则尝试提取 JSON 对象
-            try:
-                payload = json.loads(reply)
-            except json.JSONDecodeError:
-                # 尝试提取第一个 JSON 对象
-                json_match = re.search(r'\{[\s\S]*\}', reply)
-                if json_match:
-                    payload = json.loads(json_match.group())
-                else:
-                    raise
+            payload = _extract_json_object(raw_reply)
             description = payload.get("task_description") or payload.get("summary") or "待执行任务"
             targets = payload.get("target_devices") or fallback_devices or []
             frequency = payload.get("frequency") or ""
             time_req = payload.get("time_requirement") or time_requirement or ""
             return StructuredPlan(
                 task_description=str(description),
-                target_devices=[str(d) for d in targets],
+                target_devices=tuple(str(d) for d in targets),
                 time_requirement=str(time_req),
                 frequency=str(frequency),
                 raw_text=raw_reply,
@@ -912,7 +1020,7 @@ class AssistantPlanner:
         except Exception:
             return StructuredPlan(
                 task_description="任务计划生成失败，请检查配置或稍后重试。",
-                target_devices=fallback_devices or [],
+                target_devices=tuple(fallback_devices or ()),
                 time_requirement=time_requirement,
                 frequency="",
                 raw_text=raw_reply,
@@ -943,16 +1051,13 @@ class AssistantPlanner:
         Returns:
             TaskAnalysisResult: 分析结果
         """
-        # 构建日志摘要（限制长度）
-        log_text = "\n".join(logs[-50:]) if logs else "无日志"
-        if len(log_text) > 3000:
-            log_text = log_text[-3000:]
+        # 构建日志摘要（合并重复行，按 token 预算保留最新的完整行）
+        log_text = _compact_logs(logs) if logs else "无日志"
 
         duration_str = f"{int(duration_seconds // 60)}分{int(duration_seconds % 60)}秒"
 
-        analysis_prompt = f"""请分析以下手机自动化任务的执行情况，判断任务是否真正完成，识别问题并给出改进建议。
-
-## 任务信息
+        # 只包含本次任务的变量；固定的指令与格式要求在 _ANALYSIS_SYSTEM_PROMPT 中
+        analysis_prompt = f"""## 任务信息
 - **任务描述**: {task_description}
 - **执行设备**: {device_id}
 - **程序状态**: {"成功" if success else "失败"}
@@ -963,59 +1068,93 @@ class AssistantPlanner:
 ## 执行日志
 ```
 {log_text}
-```
+```"""
 
-## 请返回 JSON 格式的分析结果
-{{
-    "success_judgment": true/false,  // 你判断任务是否真正完成了预期目标
-    "confidence": "高/中/低",  // 判断的置信度
-    "issues_found": ["问题1", "问题2"],  // 发现的问题列表
-    "strategy_suggestions": ["建议1", "建议2"],  // 改进策略建议
-    "summary": "简要总结任务执行情况，2-3句话"
-}}
-
-## 分析要点
-1. **成功判断**: 不要只看程序状态，要根据日志判断任务是否真正达成目标
-   - 例如：任务是"浏览10分钟视频"，但只执行了2分钟就结束，应判断为失败
-   - 例如：任务是"发送微信消息"，但遇到登录页面没有完成，应判断为失败
-2. **问题识别**:
-   - 是否遇到登录/验证障碍？
-   - 是否有重复无效的操作？
-   - 是否正确理解了时间要求？
-   - 是否因为超时或步数限制提前结束？
-3. **策略建议**:
-   - 如何优化任务描述使AI更准确理解？
-   - 是否需要调整时间限制或步数限制？
-   - 是否需要预先处理登录问题？
-
-请只返回 JSON，不要添加其他说明。"""
+        # 只有提示词完全相同时才复用结果（日志中的数字可能决定成败，不做模糊匹配）
+        cache_key = self._analysis_cache_key(analysis_prompt)
+        cached = self._get_cached_analysis(cache_key)
+        if cached is not None:
+            return cached
 
         try:
             client = self._get_client()
             response = client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "你是一个专业的任务执行分析师，擅长分析自动化任务的执行日志，判断任务是否成功完成，识别问题并给出改进建议。"},
+                    {"role": "system", "content": _ANALYSIS_SYSTEM_PROMPT},
                     {"role": "user", "content": analysis_prompt},
                 ],
                 temperature=0.2,
             )
             raw_reply = (response.choices[0].message.content or "").strip()
-            return self._parse_analysis_result(
+            result = self._parse_analysis_result(
                 raw_reply, task_description, device_id, success
             )
+            if _PARSE_FAILED_ISSUE not in result.issues_found:
+                self._store_cached_analysis(cache_key, result)
+            return result
         except Exception as e:
             return TaskAnalysisResult(
                 task_description=task_description,
                 device_id=device_id,
                 success_judgment=success,
                 confidence="低",
-                issues_found=[f"分析失败: {str(e)}"],
-                strategy_suggestions=[],
+                issues_found=(f"分析失败: {str(e)}",),
+                strategy_suggestions=(),
                 summary=f"无法完成分析: {str(e)}",
                 raw_response="",
             )
 
+    def analyze_task_executions(
+        self,
+        jobs: List[Dict[str, Any]],
+        max_workers: int = 8,
+    ) -> List[TaskAnalysisResult]:
+        """
+        并发分析多台设备的任务执行结果
+
+        Args:
+            jobs: 每项为 analyze_task_execution 的关键字参数
+            max_workers: 最大并发请求数
+
+        Returns:
+            与 jobs 顺序一致的分析结果列表
+        """
+        if not jobs:
+            return []
+        if len(jobs) == 1:
+            return [self.analyze_task_execution(**jobs[0])]
+
+        # 分析请求以网络等待为主，线程并发即可让总耗时接近单次请求
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            return list(executor.map(lambda job: self.analyze_task_execution(**job), jobs))
+
+    def _analysis_cache_key(self, analysis_prompt: str) -> str:
+        """分析缓存键：接口地址、模型和完整提示词共同决定一次请求"""
+        material = "\0".join((self.api_base or "", self.model or "", analysis_prompt))
+        return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _get_cached_analysis(self, key: str) -> Optional[TaskAnalysisResult]:
+        """读取未过期的缓存分析结果"""
+        with self._analysis_cache_lock:
+            entry = self._analysis_cache.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ANALYSIS_CACHE_TTL:
+                del self._analysis_cache[key]
+                return None
+            self._analysis_cache.move_to_end(key)
+            return result
+
+    def _store_cached_analysis(self, key: str, result: TaskAnalysisResult):
+        """写入分析缓存，超出容量时淘汰最久未使用的条目"""
+        with self._analysis_cache_lock:
+            self._analysis_cache[key] = (time.monotonic(), result)
+            self._analysis_cache.move_to_end(key)
+            while len(self._analysis_cache) > self.ANALYSIS_CACHE_SIZE:
+                self._analysis_cache.popitem(last=False)
+
     def _parse_analysis_result(
         self,
         raw_reply: str,
@@ -1025,40 +1164,14 @@ class AssistantPlanner:
     ) -> TaskAnalysisResult:
         """解析分析结果 JSON"""
         try:
-            # 尝试提取 JSON
-            reply = raw_reply.strip()
-
-            # 处理 markdown 代码块包裹的情况
-            if reply.startswith("```"):
-                lines = reply.split("\n")
-                json_lines = []
-                in_block = False
-                for line in lines:
-                    if line.strip().startswith("```"):
-                        in_block = not in_block
-                        continue
-                    # 只在代码块内收集内容
-                    if in_block:
-                        json_lines.append(line)
-                reply = "\n".join(json_lines) if json_lines else reply
-
-            # 尝试直接解析，如果失败则尝试提取 JSON 对象
-            try:
-                payload = json.loads(reply)
-            except json.JSONDecodeError:
-                # 尝试提取第一个 JSON 对象
-                json_match = re.search(r'\{[\s\S]*\}', reply)
-                if json_match:
-                    payload = json.loads(json_match.group())
-                else:
-                    raise
+            payload = _extract_json_object(raw_reply)
             return TaskAnalysisResult(
                 task_description=task_description,
                 device_id=device_id,
                 success_judgment=bool(payload.get("success_judgment", fallback_success)),
                 confidence=str(payload.get("confidence", "中")),
-                issues_found=list(payload.get("issues_found", [])),
-                strategy_suggestions=list(payload.get("strategy_suggestions", [])),
+                issues_found=tuple(payload.get("issues_found", ())),
+                strategy_suggestions=tuple(payload.get("strategy_suggestions", ())),
                 summary=str(payload.get("summary", "")),
                 raw_response=raw_reply,
             )
@@ -1068,8 +1181,8 @@ class AssistantPlanner:
                 device_id=device_id,
                 success_judgment=fallback_success,
                 confidence="低",
-                issues_found=["无法解析分析结果"],
-                strategy_suggestions=[],
+                issues_found=(_PARSE_FAILED_ISSUE,),
+                strategy_suggestions=(),
                 summary=raw_reply[:200] if raw_reply else "分析结果解析失败",
                 raw_response=raw_reply,
             )
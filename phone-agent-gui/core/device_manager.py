@@ -2,16 +2,76 @@
 设备管理模块
 管理Android设备的连接、扫描等操作
 """
+import base64
 import os
+import platform
+import shlex
+import shutil
 import subprocess
 import re
+import string
+import struct
+import tempfile
+import urllib.request
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from .adb_helper import ADBHelper
-from .device_registry import DeviceRegistry, SavedDevice
-
-
-@dataclass
+from .device_registry import DeviceRegistry, SavedDevice, _now_iso
+
+# 常驻 shell 中每条命令结束后输出的标记（后接退出码）
+_SHELL_END_MARKER = b"__PHONE_AGENT_CMD_END__:"
+
+# input text 基础模式的转义表（单次扫描完成全部替换）
+_INPUT_TEXT_TRANS = str.maketrans({" ": "%s", "&": "\\&", "<": "\\<", ">": "\\>"})
+
+# 可直接用 input text 输入、无需 shell 额外转义的字符
+_PLAIN_INPUT_CHARS = frozenset(string.ascii_letters + string.digits + " .,:@/_+=-")
+
+# 输出解析用的正则（模块加载时编译一次）
+_IP_RE = re.compile(r"src\s+(\d+\.\d+\.\d+\.\d+)")
+_SIZE_RE = re.compile(r"(\d+)x(\d+)")
+
+# 批量 getprop 输出中各属性值之间的分隔行
+_PROP_SEPARATOR = "__PROP_SEP__"
+
+_IS_WINDOWS = platform.system() == "Windows"
+
+# 后台启动 scrcpy 的 Popen 参数
+if _IS_WINDOWS:
+    # Windows: 使用 CREATE_NEW_CONSOLE 避免阻塞
+    _SCRCPY_POPEN_KWARGS = {
+        "creationflags": subprocess.CREATE_NEW_CONSOLE,
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+    }
+else:
+    # Linux/Mac: 直接后台运行
+    _SCRCPY_POPEN_KWARGS = {
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+        "start_new_session": True,
+    }
+
+# Windows 下 scrcpy 的常见安装位置
+_SCRCPY_COMMON_PATHS = (
+    r"C:\scrcpy\scrcpy.exe",
+    r"C:\Program Files\scrcpy\scrcpy.exe",
+    r"C:\Program Files (x86)\scrcpy\scrcpy.exe",
+) if _IS_WINDOWS else ()
+
+# adb 设备状态对应的显示文字
+_STATUS_TEXT = {
+    "device": "已连接",
+    "offline": "离线",
+    "unauthorized": "未授权",
+}
+
+
+@dataclass(slots=True, frozen=True)
 class DeviceInfo:
     """设备信息（运行时状态）"""
     device_id: str
@@ -47,12 +107,23 @@ class DeviceInfo:
 
     @property
     def status_text(self) -> str:
-        status_map = {
-            "device": "已连接",
-            "offline": "离线",
-            "unauthorized": "未授权",
-        }
-        return status_map.get(self.status, self.status)
+        return _STATUS_TEXT.get(self.status, self.status)
+
+
+def _parse_adb_devices(output: str) -> Dict[str, str]:
+    """解析 adb devices [-l] 输出为 {设备ID: 状态}"""
+    devices = {}
+    for line in output.strip().split("\n")[1:]:  # 跳过 "List of devices attached"
+        parts = line.split(None, 2)
+        if len(parts) >= 2:
+            devices[parts[0]] = parts[1]
+    return devices
+
+
+def _device_sort_key(device: DeviceInfo) -> Tuple[int, str]:
+    """设备列表排序键：收藏在线 0、收藏离线 1、在线 2、离线 3"""
+    rank = (0 if device.is_favorite else 2) + (0 if device.is_online else 1)
+    return rank, device.display_name
 
 
 class DeviceManager:
@@ -62,54 +133,102 @@ class DeviceManager:
         self.adb_helper = adb_helper or ADBHelper()
         self.registry = device_registry or DeviceRegistry()
         self._current_device: Optional[str] = None
+        self._adb_path: Optional[str] = None
+
+        # 每台设备一个常驻 adb shell，点击/滑动/按键/输入复用，避免每次启动 adb 进程
+        self._shells: Dict[str, subprocess.Popen] = {}
+        self._shell_locks: Dict[str, threading.Lock] = {}
+        self._shells_lock = threading.Lock()
+        # 对象被回收或解释器退出时结束残留的 shell 进程
+        self._shells_finalizer = weakref.finalize(self, DeviceManager._terminate_shells, self._shells)
+
+        # 设备属性和分辨率在会话内不会变化，按设备ID缓存
+        self._device_info_cache: Dict[str, dict] = {}
+        self._screen_size_cache: Dict[str, Tuple[int, int]] = {}
+
+        # 最近一次 adb devices 结果 (时间戳, {设备ID: 状态})，短时间内多次查询共用
+        self._devices_cache: Tuple[float, Dict[str, str]] = (0.0, {})
 
-    def scan_devices(self, include_saved_offline: bool = True) -> List[DeviceInfo]:
+        # 已找到的 scrcpy 路径，避免每次启动投屏重复探测文件系统
+        self._scrcpy_cache: Optional[Tuple[bool, str]] = None
+
+        # 存储运行中的 scrcpy 进程（按实例隔离）
+        self._scrcpy_processes: Dict[str, subprocess.Popen] = {}
+
+    @property
+    def adb_path(self) -> str:
+        """ADB可执行文件路径（解析成功后缓存，避免每次截图重复探测）"""
+        if not self._adb_path:
+            self._adb_path = self.adb_helper.get_adb_path() or None
+        return self._adb_path or ""
+
+    def refresh_adb_path(self) -> str:
+        """ADB路径变更后重新解析"""
+        self.adb_helper._adb_path = None
+        self._adb_path = None
+        return self.adb_path
+
+    def scan_devices(self, include_saved_offline: bool = True,
+                     online_only: bool = False) -> List[DeviceInfo]:
         """
         扫描所有已连接的设备，并合并已保存设备信息
 
         Args:
             include_saved_offline: 是否包含已保存但离线的设备
+            online_only: 只返回在线设备（跳过离线设备合并和排序，按 adb 输出顺序返回）
         """
         success, output = self.adb_helper.run_command(["devices", "-l"])
         if not success:
             # 如果扫描失败，返回已保存的设备（标记为离线）
-            if include_saved_offline:
+            if include_saved_offline and not online_only:
                 return self._get_saved_devices_as_offline()
             return []
 
         devices = []
         online_device_ids = set()
+        snapshot = {}
         lines = output.strip().split("\n")
+        # 注册表快照：在线设备查找和离线设备合并共用
+        saved_map = {saved.device_id: saved for saved in self.registry.get_all()}
+        online_updates = []
+        # 循环内频繁调用的方法先绑定为局部变量
+        saved_get = saved_map.get
+        add_online = online_device_ids.add
+        append_device = devices.append
 
         for line in lines[1:]:  # 跳过第一行 "List of devices attached"
-            if not line.strip():
-                continue
-
-            parts = line.split()
+            parts = line.split(None, 2)
             if len(parts) >= 2:
                 device_id = parts[0]
                 status = parts[1]
-                online_device_ids.add(device_id)
+                add_online(device_id)
+                snapshot[device_id] = status
 
-                # 提取设备型号
+                # 提取设备型号（只在状态之后的部分查找 model: 字段）
                 model = ""
-                model_match = re.search(r"model:(\S+)", line)
-                if model_match:
-                    model = model_match.group(1).replace("_", " ")
+                if len(parts) == 3:
+                    extra = parts[2]
+                    start = extra.find("model:")
+                    if start >= 0:
+                        start += 6
+                        end = extra.find(" ", start)
+                        model = extra[start:end if end >= 0 else None].replace("_", " ")
 
                 is_remote = ":" in device_id
 
                 # 从注册表获取已保存的信息
-                saved = self.registry.get(device_id)
+                saved = saved_get(device_id)
                 custom_name = saved.custom_name if saved else ""
                 is_favorite = saved.is_favorite if saved else False
                 brand = saved.brand if saved else ""
 
                 # 如果是新设备或在线设备，更新注册表
                 if status == "device":
-                    self._update_registry_for_online_device(device_id, model, is_remote)
+                    online_updates.append((device_id, model, is_remote))
+                elif online_only:
+                    continue
 
-                devices.append(DeviceInfo(
+                append_device(DeviceInfo(
                     device_id=device_id,
                     status=status,
                     model=model or (saved.model if saved else ""),
@@ -119,12 +238,25 @@ class DeviceManager:
                     brand=brand
                 ))
 
+        # 新设备的详细信息并行读取（结果进入缓存），注册表仍按顺序更新
+        new_device_ids = [d for d, _, _ in online_updates if d not in saved_map]
+        self._prefetch_device_info(new_device_ids)
+        with self.registry.batch():
+            for device_id, model, is_remote in online_updates:
+                self._update_registry_for_online_device(device_id, model, is_remote)
+
+        # 扫描结果同时刷新在线状态快照
+        self._devices_cache = (time.monotonic(), snapshot)
+
+        if online_only:
+            return devices
+
         # 添加已保存但当前离线的设备
         if include_saved_offline:
-            for saved in self.registry.get_all():
-                if saved.device_id not in online_device_ids:
+            for saved_id, saved in saved_map.items():
+                if saved_id not in online_device_ids:
                     devices.append(DeviceInfo(
-                        device_id=saved.device_id,
+                        device_id=saved_id,
                         status="offline",
                         model=saved.model,
                         is_remote=saved.device_type == "wifi",
@@ -133,8 +265,8 @@ class DeviceManager:
                         brand=saved.brand
                     ))
 
-        # 按收藏状态和在线状态排序
-        devices.sort(key=lambda d: (not d.is_favorite, not d.is_online, d.display_name))
+        # 按收藏状态和在线状态排序（两者合并为一个整数等级，同级按名称）
+        devices.sort(key=_device_sort_key)
 
         return devices
 
@@ -153,15 +285,22 @@ class DeviceManager:
             ))
         return devices
 
+    def _prefetch_device_info(self, device_ids: List[str], max_workers: int = 8):
+        """并行读取多台设备的详细信息，填充设备信息缓存"""
+        if len(device_ids) < 2:
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(device_ids))) as pool:
+            list(pool.map(self.get_device_info_detail, device_ids))
+
     def _update_registry_for_online_device(self, device_id: str, model: str, is_remote: bool):
         """更新在线设备的注册表信息"""
         saved = self.registry.get(device_id)
         if saved:
             # 更新连接时间
-            saved.update_connection_time()
+            updates = {"last_connected": _now_iso()}
             if model and not saved.model:
-                saved.model = model
-            self.registry.save()
+                updates["model"] = model
+            self.registry.update_device_info(device_id, **updates)
         else:
             # 新设备，获取详细信息并保存
             info = self.get_device_info_detail(device_id)
@@ -179,7 +318,7 @@ class DeviceManager:
 
     def get_online_devices(self) -> List[DeviceInfo]:
         """获取所有在线设备"""
-        return [d for d in self.scan_devices() if d.is_online]
+        return self.scan_devices(online_only=True)
 
     def connect_remote(self, ip_address: str, port: int = 5555) -> Tuple[bool, str]:
         """连接远程设备（WiFi调试）"""
@@ -223,7 +362,7 @@ class DeviceManager:
         success, output = self.adb_helper.run_command(args)
         if success:
             # 解析IP地址
-            match = re.search(r"src\s+(\d+\.\d+\.\d+\.\d+)", output)
+            match = _IP_RE.search(output)
             if match:
                 return match.group(1)
         return None
@@ -238,9 +377,18 @@ class DeviceManager:
 
     def take_screenshot(self, device_id: str = None) -> Tuple[bool, bytes]:
         """截取设备屏幕"""
-        adb_path = self.adb_helper.get_adb_path()
+        return self._screencap(device_id, ["screencap", "-p"])
+
+    def take_screenshot_to(self, fileobj, device_id: str = None) -> Tuple[bool, str]:
+        """
+        截图并直接写入文件对象（PNG），不在内存中保留完整图片
+
+        Args:
+            fileobj: 以二进制模式打开的可写文件对象
+        """
+        adb_path = self.adb_path
         if not adb_path:
-            return False, b""
+            return False, "ADB不可用"
 
         args = [adb_path]
         if device_id:
@@ -248,19 +396,117 @@ class DeviceManager:
         args.extend(["exec-out", "screencap", "-p"])
 
         try:
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 args,
-                capture_output=True,
-                timeout=10
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=64 * 1024,
             )
-            if result.returncode == 0 and result.stdout:
-                return True, result.stdout
+            watchdog = threading.Timer(10, proc.kill)
+            watchdog.start()
+            try:
+                shutil.copyfileobj(proc.stdout, fileobj, 64 * 1024)
+                proc.wait()
+            finally:
+                watchdog.cancel()
+                proc.stdout.close()
+                # 写入出错时进程可能仍在运行，结束并回收，避免残留 adb 进程
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            if proc.returncode == 0:
+                return True, "截图已保存"
+            return False, "截图失败"
+        except Exception as e:
+            return False, f"截图失败: {str(e)}"
+
+    def take_screenshot_raw(
+        self, device_id: str = None
+    ) -> Tuple[bool, Optional[Tuple[int, int, int, memoryview]]]:
+        """
+        截取原始帧缓冲（不经过 PNG 编码）
+
+        设备端省去 PNG 压缩，主机端省去 PNG 解码，适合高帧率连续截图。
+        失败时调用方可回退到 take_screenshot 的 PNG 路径。
+
+        Returns:
+            (success, (width, height, pixel_format, pixels))，pixels 为 RGBA 数据视图
+        """
+        success, data = self._screencap(device_id, ["screencap"])
+        if not success or len(data) < 12:
+            return False, None
+
+        width, height, pixel_format = struct.unpack_from("<III", data, 0)
+        pixel_bytes = width * height * 4
+        if width <= 0 or height <= 0:
+            return False, None
+
+        # Android 9+ 头部多一个 colorspace 字段（16 字节），更早版本为 12 字节
+        if len(data) >= 16 + pixel_bytes:
+            header_size = 16
+        elif len(data) >= 12 + pixel_bytes:
+            header_size = 12
+        else:
+            return False, None
+
+        pixels = memoryview(data)[header_size:header_size + pixel_bytes]
+        return True, (width, height, pixel_format, pixels)
+
+    def _screencap(self, device_id: Optional[str], command: List[str]) -> Tuple[bool, bytes]:
+        """通过 exec-out 执行截图命令，返回原始输出字节"""
+        adb_path = self.adb_path
+        if not adb_path:
+            return False, b""
+
+        args = [adb_path]
+        if device_id:
+            args.extend(["-s", device_id])
+        args.append("exec-out")
+        args.extend(command)
+
+        try:
+            # 只接管 stdout，stderr 直接丢弃，避免额外管道和读线程
+            proc = subprocess.Popen(
+                args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=64 * 1024,
+            )
+            try:
+                data, _ = proc.communicate(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                return False, b""
+            if proc.returncode == 0 and data:
+                return True, data
             return False, b""
         except Exception:
             return False, b""
 
     def get_device_info_detail(self, device_id: str) -> dict:
-        """获取设备详细信息"""
+        """
+        获取设备详细信息
+
+        结果按设备ID缓存；注册表中已有完整属性的设备直接使用保存的值，
+        不再调用 getprop。设备重新插拔或刷机后可调用 invalidate_device_info。
+        """
+        cached = self._device_info_cache.get(device_id)
+        if cached is not None:
+            return dict(cached)
+
+        saved = self.registry.get(device_id)
+        if saved and saved.brand and saved.model and saved.android_version and saved.sdk_version:
+            info = {
+                "device_id": device_id,
+                "brand": saved.brand,
+                "model": saved.model,
+                "android_version": saved.android_version,
+                "sdk_version": saved.sdk_version,
+            }
+            self._device_info_cache[device_id] = info
+            return dict(info)
+
         info = {
             "device_id": device_id,
             "brand": "",
@@ -276,18 +522,35 @@ class DeviceManager:
             ("sdk_version", "ro.build.version.sdk"),
         ]
 
-        for key, prop in props:
-            args = ["-s", device_id, "shell", "getprop", prop]
-            success, output = self.adb_helper.run_command(args)
-            if success:
-                info[key] = output.strip()
-
-        return info
+        # 一次 shell 调用读取全部属性，各值之间以分隔符隔开
+        cmd = f"; echo {_PROP_SEPARATOR}; ".join(f"getprop {prop}" for _, prop in props)
+        success, output = self.adb_helper.run_command(["-s", device_id, "shell", cmd])
+        if success:
+            values = output.split(_PROP_SEPARATOR)
+            for (key, _), value in zip(props, values):
+                info[key] = value.strip()
+
+        # 全部读取失败（设备离线等）时不缓存，下次重试
+        if info["brand"] or info["model"]:
+            self._device_info_cache[device_id] = info
+        return dict(info)
+
+    def invalidate_device_info(self, device_id: str = None):
+        """清除设备属性和分辨率缓存（不指定设备则全部清除）"""
+        if device_id is None:
+            self._device_info_cache.clear()
+            self._screen_size_cache.clear()
+        else:
+            self._device_info_cache.pop(device_id, None)
+            self._screen_size_cache.pop(device_id, None)
 
     # ==================== 远程操作功能 ====================
 
     def get_screen_size(self, device_id: str = None) -> Tuple[int, int]:
         """获取屏幕分辨率"""
+        if device_id and device_id in self._screen_size_cache:
+            return self._screen_size_cache[device_id]
+
         args = []
         if device_id:
             args.extend(["-s", device_id])
@@ -295,19 +558,17 @@ class DeviceManager:
 
         success, output = self.adb_helper.run_command(args)
         if success:
-            match = re.search(r"(\d+)x(\d+)", output)
+            match = _SIZE_RE.search(output)
             if match:
-                return int(match.group(1)), int(match.group(2))
+                size = (int(match.group(1)), int(match.group(2)))
+                if device_id:
+                    self._screen_size_cache[device_id] = size
+                return size
         return 1080, 1920  # 默认分辨率
 
     def tap(self, x: int, y: int, device_id: str = None) -> Tuple[bool, str]:
         """点击屏幕指定坐标"""
-        args = []
-        if device_id:
-            args.extend(["-s", device_id])
-        args.extend(["shell", "input", "tap", str(x), str(y)])
-
-        success, output = self.adb_helper.run_command(args)
+        success, output = self._shell_exec(f"input tap {x} {y}", device_id)
         if success:
             return True, f"点击 ({x}, {y})"
         return False, output or "点击失败"
@@ -315,13 +576,9 @@ class DeviceManager:
     def swipe(self, x1: int, y1: int, x2: int, y2: int,
               duration: int = 300, device_id: str = None) -> Tuple[bool, str]:
         """滑动屏幕"""
-        args = []
-        if device_id:
-            args.extend(["-s", device_id])
-        args.extend(["shell", "input", "swipe",
-                    str(x1), str(y1), str(x2), str(y2), str(duration)])
-
-        success, output = self.adb_helper.run_command(args)
+        success, output = self._shell_exec(
+            f"input swipe {x1} {y1} {x2} {y2} {duration}", device_id
+        )
         if success:
             return True, f"滑动 ({x1},{y1}) -> ({x2},{y2})"
         return False, output or "滑动失败"
@@ -334,46 +591,95 @@ class DeviceManager:
 
     def input_text(self, text: str, device_id: str = None) -> Tuple[bool, str]:
         """输入文本（需要先聚焦输入框）"""
-        import base64
-
-        args = []
-        if device_id:
-            args.extend(["-s", device_id])
+        # 纯英文数字等普通字符直接用 input text，不依赖 ADB Keyboard 也省去广播
+        if text and _PLAIN_INPUT_CHARS.issuperset(text):
+            success, output = self._shell_exec(
+                f"input text {text.translate(_INPUT_TEXT_TRANS)}", device_id
+            )
+            if success:
+                return True, "已输入文本"
 
         # 使用 ADB Keyboard 广播方式输入（支持中文）
         # 必须使用 Base64 编码，这是 ADB Keyboard 的标准接口
         encoded_text = base64.b64encode(text.encode("utf-8")).decode("utf-8")
-        args.extend(["shell", "am", "broadcast", "-a",
-                    "ADB_INPUT_B64", "--es", "msg", encoded_text])
-
-        success, output = self.adb_helper.run_command(args)
+        success, output = self._shell_exec(
+            f"am broadcast -a ADB_INPUT_B64 --es msg {encoded_text}", device_id
+        )
         if success:
-            return True, f"已输入文本"
+            return True, "已输入文本"
 
         # 如果 ADB Keyboard 不可用，回退到基础输入（仅英文）
-        args = []
-        if device_id:
-            args.extend(["-s", device_id])
         # 转义特殊字符
-        escaped_text = text.replace(" ", "%s").replace("&", "\\&").replace("<", "\\<").replace(">", "\\>")
-        args.extend(["shell", "input", "text", escaped_text])
-        success, output = self.adb_helper.run_command(args)
+        escaped_text = text.translate(_INPUT_TEXT_TRANS)
+        success, output = self._shell_exec(f"input text {escaped_text}", device_id)
         if success:
-            return True, f"已输入文本 (基础模式，仅支持英文)"
+            return True, "已输入文本 (基础模式，仅支持英文)"
         return False, output or "输入失败"
 
     def press_key(self, keycode: str, device_id: str = None) -> Tuple[bool, str]:
         """按下按键"""
-        args = []
-        if device_id:
-            args.extend(["-s", device_id])
-        args.extend(["shell", "input", "keyevent", keycode])
-
-        success, output = self.adb_helper.run_command(args)
+        success, output = self._shell_exec(f"input keyevent {keycode}", device_id)
         if success:
             return True, f"按键 {keycode}"
         return False, output or "按键失败"
 
+    def run_gesture_script(self, steps: List[str],
+                           device_id: str = None) -> Tuple[bool, str]:
+        """
+        一次执行多条 shell 操作（如 "input tap 100 200"、"input keyevent 66"）
+
+        各步骤以 && 连接为一条命令，任一步失败即停止，
+        只需一次 shell 往返。
+        """
+        if not steps:
+            return True, "无操作"
+        success, output = self._shell_exec(" && ".join(steps), device_id)
+        if success:
+            return True, f"已执行 {len(steps)} 个操作"
+        return False, output or "操作执行失败"
+
+    def batch(self, ops: List[Tuple[str, tuple]], device_id: str = None) -> Tuple[bool, str]:
+        """
+        批量执行一组操作，只需一次 shell 往返
+
+        Args:
+            ops: 操作列表，每项为 (操作名, 参数元组)，支持：
+                - ("tap", (x, y))
+                - ("swipe", (x1, y1, x2, y2[, duration]))
+                - ("long_press", (x, y[, duration]))
+                - ("key", (keycode,))
+                - ("text", (text,))  仅限英文数字等普通字符，中文等请单独调用 input_text
+                - ("sleep", (毫秒,))
+        """
+        steps = []
+        for name, params in ops:
+            if name == "tap":
+                x, y = params
+                steps.append(f"input tap {x} {y}")
+            elif name == "swipe":
+                x1, y1, x2, y2, *rest = params
+                duration = rest[0] if rest else 300
+                steps.append(f"input swipe {x1} {y1} {x2} {y2} {duration}")
+            elif name == "long_press":
+                x, y, *rest = params
+                duration = rest[0] if rest else 1000
+                steps.append(f"input swipe {x} {y} {x} {y} {duration}")
+            elif name == "key":
+                steps.append(f"input keyevent {params[0]}")
+            elif name == "text":
+                text = params[0]
+                if not text:
+                    continue
+                # 拼接后的脚本走 shell 解析，只接受普通字符并整体加引号
+                if not _PLAIN_INPUT_CHARS.issuperset(text):
+                    return False, "批量操作的文本仅支持英文、数字和常用符号，请改用 input_text"
+                steps.append(f"input text {shlex.quote(text.translate(_INPUT_TEXT_TRANS))}")
+            elif name == "sleep":
+                steps.append(f"sleep {params[0] / 1000:g}")
+            else:
+                return False, f"不支持的操作: {name}"
+        return self.run_gesture_script(steps, device_id)
+
     def press_back(self, device_id: str = None) -> Tuple[bool, str]:
         """返回键"""
         return self.press_key("KEYCODE_BACK", device_id)
@@ -392,17 +698,13 @@ class DeviceManager:
 
     def install_apk(self, apk_path: str, device_id: str = None) -> Tuple[bool, str]:
         """安装APK（支持大文件，超时5分钟）"""
-        import os
         args = []
         if device_id:
             args.extend(["-s", device_id])
         args.extend(["install", "-r", apk_path])
 
-        # 根据文件大小动态调整超时时间
-        # 基础60秒 + 每10MB额外30秒，最长10分钟
         try:
-            file_size_mb = os.path.getsize(apk_path) / (1024 * 1024)
-            timeout = min(60 + int(file_size_mb / 10) * 30, 600)
+            timeout = self._install_timeout(os.path.getsize(apk_path))
         except Exception:
             timeout = 300  # 默认5分钟
 
@@ -411,19 +713,106 @@ class DeviceManager:
             return True, "安装成功"
         return False, output or "安装失败"
 
+    @staticmethod
+    def _install_timeout(size_bytes: int) -> int:
+        """根据文件大小计算安装超时：基础60秒 + 每10MB额外30秒，最长10分钟"""
+        return min(60 + (size_bytes // (10 * 1024 * 1024)) * 30, 600)
+
     def install_apk_from_url(self, url: str, device_id: str = None) -> Tuple[bool, str]:
         """从URL下载并安装APK"""
-        import tempfile
-        import urllib.request
-
         try:
-            # 下载APK到临时文件
-            with tempfile.NamedTemporaryFile(suffix=".apk", delete=False) as f:
-                urllib.request.urlretrieve(url, f.name)
-                return self.install_apk(f.name, device_id)
+            # timeout 作用于连接和每次读取，避免服务器停止响应时无限等待
+            with urllib.request.urlopen(url, timeout=30) as response:
+                length = response.headers.get("Content-Length")
+                if not (length and length.isdigit() and self.adb_path):
+                    # 大小未知，先分块下载到临时文件再安装
+                    return self._install_apk_download(response, device_id)
+
+                # 已知大小时边下载边通过 stdin 推给 pm install，不落盘
+                success, message, fallback = self._install_apk_stream(
+                    response, int(length), device_id
+                )
+                if not fallback:
+                    return success, message
+
+            # 设备不支持 exec-in 流式安装，重新下载到临时文件后安装
+            with urllib.request.urlopen(url, timeout=30) as response:
+                return self._install_apk_download(response, device_id)
         except Exception as e:
             return False, f"下载失败: {str(e)}"
 
+    def _install_apk_download(self, response, device_id: str = None) -> Tuple[bool, str]:
+        """将下载内容写入临时文件后用 adb install 安装"""
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(suffix=".apk", delete=False) as f:
+                temp_path = f.name
+                shutil.copyfileobj(response, f, 1 << 20)
+            return self.install_apk(temp_path, device_id)
+        finally:
+            if temp_path:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def _install_apk_stream(self, stream, size: int,
+                            device_id: str = None) -> Tuple[bool, str, bool]:
+        """
+        将APK数据流直接写入 adb exec-in pm install
+
+        读取下载流出错时直接抛出异常（下载失败）。
+
+        Returns:
+            (是否成功, 消息, 是否需要回退到临时文件安装)
+        """
+        args = [self.adb_path]
+        if device_id:
+            args.extend(["-s", device_id])
+        args.extend(["exec-in", "pm", "install", "-r", "-S", str(size)])
+
+        proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        watchdog = threading.Timer(self._install_timeout(size), proc.kill)
+        watchdog.start()
+        try:
+            try:
+                while True:
+                    chunk = stream.read(1 << 20)
+                    if not chunk:
+                        break
+                    try:
+                        proc.stdin.write(chunk)
+                    except OSError:
+                        # pm/adb 提前退出（管道断开），由下面的输出判断原因
+                        break
+            except BaseException:
+                proc.kill()
+                raise
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+            output = proc.stdout.read().decode("utf-8", errors="replace").strip()
+            proc.wait()
+            timed_out = not watchdog.is_alive()
+        finally:
+            watchdog.cancel()
+
+        if proc.returncode == 0 and "Success" in output:
+            return True, "安装成功", False
+        if timed_out:
+            return False, "安装超时", False
+        if "Failure" in output:
+            # pm 已收到完整数据并明确拒绝安装，重试也不会成功
+            return False, output, False
+        return False, output or "安装失败", True
+
     def open_settings(self, device_id: str = None) -> Tuple[bool, str]:
         """打开系统设置"""
         args = []
@@ -502,6 +891,132 @@ class DeviceManager:
 
         return self.adb_helper.run_command(args, timeout=30)
 
+    # ==================== 常驻 shell 会话 ====================
+
+    def _get_shell(self, device_id: Optional[str]) -> Optional[subprocess.Popen]:
+        """获取（必要时启动）设备的常驻 adb shell"""
+        key = device_id or ""
+        proc = self._shells.get(key)
+        if proc is not None and proc.poll() is None:
+            return proc
+
+        adb_path = self.adb_path
+        if not adb_path:
+            return None
+
+        args = [adb_path]
+        if device_id:
+            args.extend(["-s", device_id])
+        # -T 不分配伪终端：避免命令被回显（回显中也含结束标记）以及输出变成 \r\n
+        args.extend(["shell", "-T"])
+
+        # 二进制模式读写，避免 Windows 文本模式把换行写成 \r\n
+        proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+        )
+        self._shells[key] = proc
+        return proc
+
+    def _shell_exec(self, command: str, device_id: str = None,
+                    timeout: int = 30) -> Tuple[bool, str]:
+        """
+        在常驻 shell 中执行一条命令
+
+        常驻 shell 不可用时回退为单次 adb shell 调用；命令写入后 shell 才中断的，
+        不再回退，避免点击、滑动等操作被重复执行。
+
+        Returns:
+            (命令退出码是否为 0, 输出内容)
+        """
+        key = device_id or ""
+        with self._shells_lock:
+            lock = self._shell_locks.setdefault(key, threading.Lock())
+
+        with lock:
+            proc = None
+            sent = False
+            try:
+                proc = self._get_shell(device_id)
+                if proc is not None:
+                    # 超时直接结束 shell 进程，让下面的读取返回 EOF
+                    watchdog = threading.Timer(timeout, proc.kill)
+                    watchdog.start()
+                    try:
+                        line = f"{command}\necho {_SHELL_END_MARKER.decode()}$?\n"
+                        proc.stdin.write(line.encode("utf-8"))
+                        sent = True
+                        output = []
+                        for raw in iter(proc.stdout.readline, b""):
+                            idx = raw.find(_SHELL_END_MARKER)
+                            if idx < 0:
+                                output.append(raw)
+                                continue
+                            output.append(raw[:idx])
+                            code = raw[idx + len(_SHELL_END_MARKER):].strip()
+                            text = b"".join(output).decode("utf-8", errors="replace").strip()
+                            return code == b"0", text
+                        # 看门狗已触发说明命令超时，不再重复执行
+                        if not watchdog.is_alive():
+                            self._close_shell(key)
+                            return False, "命令执行超时"
+                    finally:
+                        watchdog.cancel()
+            except (OSError, ValueError):
+                pass
+            # shell 已退出或启动失败，丢弃后走单次调用
+            if proc is not None:
+                self._close_shell(key)
+            if sent:
+                return False, "shell 会话已中断"
+
+        args = []
+        if device_id:
+            args.extend(["-s", device_id])
+        args.extend(["shell", command])
+        return self.adb_helper.run_command(args, timeout=timeout)
+
+    def _close_shell(self, key: str):
+        """关闭指定设备的常驻 shell"""
+        proc = self._shells.pop(key, None)
+        if proc is not None:
+            DeviceManager._terminate_shells({key: proc})
+
+    @staticmethod
+    def _terminate_shells(shells: Dict[str, subprocess.Popen]):
+        """结束给定的 shell 进程（不引用 DeviceManager 实例，可用于 finalize）"""
+        for proc in list(shells.values()):
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+            try:
+                proc.terminate()
+                proc.wait(timeout=2)
+            except Exception:
+                try:
+                    proc.kill()
+                except Exception:
+                    pass
+        shells.clear()
+
+    def close_shells(self):
+        """关闭所有常驻 shell 会话"""
+        with self._shells_lock:
+            locks = [(key, self._shell_locks.setdefault(key, threading.Lock()))
+                     for key in list(self._shells.keys())]
+        # 持有设备锁再关闭，避免打断正在执行的命令
+        for key, lock in locks:
+            with lock:
+                self._close_shell(key)
+
+    def close(self):
+        """释放设备管理器持有的后台进程"""
+        self.close_shells()
+
     # ==================== 设备注册表操作 ====================
 
     def set_device_name(self, device_id: str, name: str) -> bool:
@@ -573,37 +1088,60 @@ class DeviceManager:
 
     def _check_device_online(self, device_id: str) -> bool:
         """快速检查设备是否在线"""
+        return self._get_devices_snapshot().get(device_id) == "device"
+
+    def _get_devices_snapshot(self, ttl: float = 0.5) -> Dict[str, str]:
+        """
+        获取 {设备ID: 状态} 快照
+
+        ttl 秒内复用上次结果，界面刷新逐个查询设备时只需一次 adb devices。
+        """
+        timestamp, snapshot = self._devices_cache
+        if time.monotonic() - timestamp < ttl:
+            return snapshot
+
         success, output = self.adb_helper.run_command(["devices"])
         if not success:
-            return False
-        # 检查设备ID是否在输出中且状态为device
-        for line in output.strip().split("\n"):
-            if line.startswith(device_id) and "\tdevice" in line:
-                return True
-        return False
+            return {}
+        snapshot = _parse_adb_devices(output)
+        self._devices_cache = (time.monotonic(), snapshot)
+        return snapshot
 
     # ==================== scrcpy 投屏功能 ====================
 
-    # 存储运行中的 scrcpy 进程
-    _scrcpy_processes: dict = {}
+    def _reap_scrcpy(self):
+        """移除已退出的 scrcpy 进程记录（例如用户直接关闭了投屏窗口）"""
+        for key, process in list(self._scrcpy_processes.items()):
+            if process.poll() is not None:
+                del self._scrcpy_processes[key]
 
     def get_bundled_scrcpy_path(self) -> str:
         """获取内置scrcpy工具路径"""
-        import platform
-
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         scrcpy_dir = os.path.join(base_dir, "scrcpy")
 
-        if platform.system() == "Windows":
+        if _IS_WINDOWS:
             return os.path.join(scrcpy_dir, "scrcpy.exe")
         else:
             return os.path.join(scrcpy_dir, "scrcpy")
 
     def is_scrcpy_available(self) -> Tuple[bool, str]:
-        """检查 scrcpy 是否可用"""
-        import shutil
-        import platform
-
+        """检查 scrcpy 是否可用（找到后缓存结果）"""
+        if self._scrcpy_cache is not None:
+            return self._scrcpy_cache
+
+        available, path = self._find_scrcpy()
+        # 未找到时不缓存，用户安装后无需重启即可检测到
+        if available:
+            self._scrcpy_cache = (available, path)
+        return available, path
+
+    def invalidate_scrcpy_cache(self):
+        """清除 scrcpy 路径缓存（scrcpy 被移动或卸载后调用）"""
+        self._scrcpy_cache = None
+
+    def _find_scrcpy(self) -> Tuple[bool, str]:
+        """在内置目录、PATH 和常见安装位置中查找 scrcpy"""
         # 优先检查内置scrcpy
         bundled = self.get_bundled_scrcpy_path()
         if os.path.exists(bundled):
@@ -615,15 +1153,9 @@ class DeviceManager:
             return True, scrcpy_path
 
         # Windows 下检查常见安装位置
-        if platform.system() == "Windows":
-            common_paths = [
-                r"C:\scrcpy\scrcpy.exe",
-                r"C:\Program Files\scrcpy\scrcpy.exe",
-                r"C:\Program Files (x86)\scrcpy\scrcpy.exe",
-            ]
-            for path in common_paths:
-                if os.path.exists(path):
-                    return True, path
+        for path in _SCRCPY_COMMON_PATHS:
+            if os.path.exists(path):
+                return True, path
 
         return False, ""
 
@@ -645,15 +1177,14 @@ class DeviceManager:
         Returns:
             (success, message)
         """
-        import platform
-
         # 检查 scrcpy 是否可用
         available, scrcpy_path = self.is_scrcpy_available()
         if not available:
             return False, "scrcpy 未安装。请从 https://github.com/Genymobile/scrcpy 下载安装"
 
         # 如果该设备已有 scrcpy 运行，先停止
-        if device_id and device_id in self._scrcpy_processes:
+        self._reap_scrcpy()
+        if (device_id or "default") in self._scrcpy_processes:
             self.stop_scrcpy(device_id)
 
         # 构建命令
@@ -692,22 +1223,7 @@ class DeviceManager:
 
         try:
             # 在后台启动 scrcpy
-            if platform.system() == "Windows":
-                # Windows: 使用 CREATE_NEW_CONSOLE 避免阻塞
-                process = subprocess.Popen(
-                    cmd,
-                    creationflags=subprocess.CREATE_NEW_CONSOLE,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-            else:
-                # Linux/Mac: 直接后台运行
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    start_new_session=True,
-                )
+            process = subprocess.Popen(cmd, **_SCRCPY_POPEN_KWARGS)
 
             # 记录进程
             key = device_id or "default"
@@ -716,12 +1232,15 @@ class DeviceManager:
             return True, "投屏已启动"
 
         except Exception as e:
+            # 缓存的路径可能已失效，下次重新查找
+            self.invalidate_scrcpy_cache()
             return False, f"启动失败: {str(e)}"
 
     def stop_scrcpy(self, device_id: str = None) -> Tuple[bool, str]:
         """停止 scrcpy 投屏"""
         key = device_id or "default"
 
+        self._reap_scrcpy()
         if key not in self._scrcpy_processes:
             return False, "没有运行中的投屏"
 
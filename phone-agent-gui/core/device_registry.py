@@ -4,15 +4,59 @@
 """
 import json
 import os
-from dataclasses import dataclass, asdict, field
-from typing import List, Optional, Dict
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime
 
 from config.settings import get_user_data_path
 
+try:
+    # 可选依赖：orjson 序列化/解析更快，未安装时回退到标准库
+    import orjson
 
-@dataclass
-class SavedDevice:
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+    _loads = json.loads
+
+# 进程内已解析文件的缓存：{路径: ((mtime_ns, 大小), devices 原始字典列表)}
+# 多个 DeviceRegistry 实例或重复 load 时，文件未变化则不再重新解析
+_load_cache: Dict[str, Tuple[Tuple[int, int], list]] = {}
+_load_cache_lock = threading.Lock()
+
+# 最近一次格式化的时间 [整秒时间戳, ISO 字符串]，同一秒内重复调用直接复用
+_last_timestamp = [0, ""]
+
+
+def _now_iso() -> str:
+    """当前时间的 ISO 格式字符串（精确到秒）"""
+    now = int(time.time())
+    if now != _last_timestamp[0]:
+        _last_timestamp[1] = datetime.fromtimestamp(now).isoformat()
+        _last_timestamp[0] = now
+    return _last_timestamp[1]
+
+
+class _SearchBlobSlot:
+    """
+    为 SavedDevice 提供 _search_blob 槽位
+
+    小写的 ID/名称/型号/品牌拼接串，只供搜索使用，不是 dataclass 字段，
+    因此不会出现在 fields()/asdict() 和序列化结果中。
+    """
+    __slots__ = ("_search_blob",)
+
+
+@dataclass(slots=True)
+class SavedDevice(_SearchBlobSlot):
     """已保存的设备信息"""
     device_id: str                    # 原始设备ID (如 192.168.1.100:5555 或 emulator-5554)
     custom_name: str = ""             # 用户自定义名称
@@ -26,6 +70,13 @@ class SavedDevice:
     is_favorite: bool = False         # 是否收藏
     notes: str = ""                   # 备注信息
 
+    def __post_init__(self):
+        self._rebuild_search_blob()
+
+    def _rebuild_search_blob(self):
+        """ID、名称、型号、品牌变化后需重新生成搜索串"""
+        self._search_blob = f"{self.device_id}\0{self.custom_name}\0{self.model}\0{self.brand}".lower()
+
     @property
     def display_name(self) -> str:
         """显示名称：优先使用自定义名称"""
@@ -44,17 +95,78 @@ class SavedDevice:
         return name
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {
+            "device_id": self.device_id,
+            "custom_name": self.custom_name,
+            "device_type": self.device_type,
+            "connection_address": self.connection_address,
+            "brand": self.brand,
+            "model": self.model,
+            "android_version": self.android_version,
+            "sdk_version": self.sdk_version,
+            "last_connected": self.last_connected,
+            "is_favorite": self.is_favorite,
+            "notes": self.notes,
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> "SavedDevice":
-        valid_fields = {f.name for f in cls.__dataclass_fields__.values()}
-        filtered_data = {k: v for k, v in data.items() if k in valid_fields}
-        return cls(**filtered_data)
+        # 直接按字段填充槽位，跳过生成的 __init__ 的参数绑定和中间字典
+        device = object.__new__(cls)
+        device.device_id = data["device_id"]
+        for name, default in _SAVED_DEVICE_DEFAULTS:
+            setattr(device, name, data.get(name, default))
+        device._rebuild_search_blob()
+        return device
 
     def update_connection_time(self):
         """更新最后连接时间"""
-        self.last_connected = datetime.now().isoformat()
+        self.last_connected = _now_iso()
+
+
+# SavedDevice 的字段名集合（导入时计算一次，供 from_dict 过滤未知字段）
+_SAVED_DEVICE_FIELDS = frozenset(f.name for f in fields(SavedDevice))
+# 除 device_id 外各字段的 (名称, 默认值)，供 from_dict 按顺序填充
+_SAVED_DEVICE_DEFAULTS = tuple(
+    (f.name, f.default) for f in fields(SavedDevice) if f.name != "device_id"
+)
+
+
+def _atomic_write(path: str, payload: bytes):
+    """先完整写入临时文件再替换目标文件，写入中途崩溃不会留下半截文件"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_devices_data(path: str) -> list:
+    """读取文件中的 devices 列表，文件未变化时直接复用上次的解析结果"""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _load_cache_lock:
+        cached = _load_cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+    with open(path, "rb") as f:
+        data = _loads(f.read())
+    devices_data = data.get("devices", [])
+    with _load_cache_lock:
+        _load_cache[path] = (key, devices_data)
+    return devices_data
+
+
+def _remember_devices_data(path: str, devices_data: list):
+    """保存后记录刚写入的内容，其他实例加载时无需重新解析"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    with _load_cache_lock:
+        _load_cache[path] = ((stat.st_mtime_ns, stat.st_size), devices_data)
 
 
 class DeviceRegistry:
@@ -63,6 +175,15 @@ class DeviceRegistry:
     def __init__(self):
         self._devices: Dict[str, SavedDevice] = {}
         self._config_path = self._get_config_path()
+        # 批量修改时推迟保存：_batch_depth > 0 期间只标记 _dirty
+        self._dirty = False
+        self._batch_depth = 0
+        # 自定义名称索引，设备变更后置为 None，下次按名称查找时重建
+        self._by_name: Optional[Dict[str, SavedDevice]] = None
+        # 已收藏设备，随收藏状态变化增量维护
+        self._favorites: Dict[str, SavedDevice] = {}
+        # 最近一次写入（或加载）的设备记录，内容未变时跳过写文件
+        self._last_saved: Optional[list] = None
         self.load()
 
     def _get_config_path(self) -> str:
@@ -73,26 +194,53 @@ class DeviceRegistry:
 
     def load(self):
         """从文件加载设备列表"""
+        self._by_name = None
         try:
             if os.path.exists(self._config_path):
-                with open(self._config_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    devices_data = data.get("devices", [])
-                    self._devices = {
-                        d["device_id"]: SavedDevice.from_dict(d)
-                        for d in devices_data
-                    }
-        except (json.JSONDecodeError, KeyError, TypeError):
+                devices_data = _read_devices_data(self._config_path)
+                self._devices = {
+                    d["device_id"]: SavedDevice.from_dict(d)
+                    for d in devices_data
+                }
+                self._last_saved = devices_data
+        except (ValueError, KeyError, TypeError, AttributeError):
             self._devices = {}
+        self._favorites = {
+            device_id: d for device_id, d in self._devices.items() if d.is_favorite
+        }
 
     def save(self):
-        """保存设备列表到文件"""
+        """保存设备列表到文件（设备记录与上次写入完全相同时跳过）"""
+        devices_data = [d.to_dict() for d in self._devices.values()]
+        if devices_data == self._last_saved:
+            self._dirty = False
+            return
         data = {
-            "devices": [d.to_dict() for d in self._devices.values()],
-            "updated_at": datetime.now().isoformat()
+            "devices": devices_data,
+            "updated_at": _now_iso()
         }
-        with open(self._config_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _atomic_write(self._config_path, _dumps(data))
+        _remember_devices_data(self._config_path, devices_data)
+        self._last_saved = devices_data
+        self._dirty = False
+
+    @contextmanager
+    def batch(self):
+        """批量修改：块内的所有变更在退出时只写一次文件"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self.save()
+
+    def _maybe_save(self):
+        """标记有未保存的变更，不在批量修改中时立即保存"""
+        self._dirty = True
+        self._by_name = None
+        if self._batch_depth == 0:
+            self.save()
 
     def get(self, device_id: str) -> Optional[SavedDevice]:
         """获取设备信息"""
@@ -104,10 +252,17 @@ class DeviceRegistry:
 
     def get_favorites(self) -> List[SavedDevice]:
         """获取收藏的设备"""
-        return [d for d in self._devices.values() if d.is_favorite]
+        return list(self._favorites.values())
+
+    def _sync_favorite(self, device: SavedDevice):
+        """根据设备当前收藏状态更新收藏索引"""
+        if device.is_favorite:
+            self._favorites[device.device_id] = device
+        else:
+            self._favorites.pop(device.device_id, None)
 
     def add_or_update(self, device: SavedDevice) -> SavedDevice:
-        """添加或更新设备"""
+        """添加或更新设备（在 batch() 块内调用时推迟到块结束再保存）"""
         existing = self._devices.get(device.device_id)
         if existing:
             # 保留用户设置的字段
@@ -117,9 +272,11 @@ class DeviceRegistry:
                 device.notes = existing.notes
             if existing.is_favorite:
                 device.is_favorite = True
+            device._rebuild_search_blob()
 
         self._devices[device.device_id] = device
-        self.save()
+        self._sync_favorite(device)
+        self._maybe_save()
         return device
 
     def update_device_info(self, device_id: str, **kwargs) -> Optional[SavedDevice]:
@@ -128,11 +285,14 @@ class DeviceRegistry:
         if not device:
             return None
 
+        # 只接受持久化字段，忽略未知参数以及 display_name 等只读属性
         for key, value in kwargs.items():
-            if hasattr(device, key):
+            if key in _SAVED_DEVICE_FIELDS:
                 setattr(device, key, value)
 
-        self.save()
+        device._rebuild_search_blob()
+        self._sync_favorite(device)
+        self._maybe_save()
         return device
 
     def set_custom_name(self, device_id: str, name: str) -> bool:
@@ -140,7 +300,8 @@ class DeviceRegistry:
         device = self._devices.get(device_id)
         if device:
             device.custom_name = name
-            self.save()
+            device._rebuild_search_blob()
+            self._maybe_save()
             return True
         return False
 
@@ -149,7 +310,8 @@ class DeviceRegistry:
         device = self._devices.get(device_id)
         if device:
             device.is_favorite = is_favorite
-            self.save()
+            self._sync_favorite(device)
+            self._maybe_save()
             return True
         return False
 
@@ -158,7 +320,7 @@ class DeviceRegistry:
         device = self._devices.get(device_id)
         if device:
             device.notes = notes
-            self.save()
+            self._maybe_save()
             return True
         return False
 
@@ -166,34 +328,32 @@ class DeviceRegistry:
         """删除已保存的设备"""
         if device_id in self._devices:
             del self._devices[device_id]
-            self.save()
+            self._favorites.pop(device_id, None)
+            self._maybe_save()
             return True
         return False
 
     def get_by_name(self, name: str) -> Optional[SavedDevice]:
         """通过自定义名称查找设备"""
-        for device in self._devices.values():
-            if device.custom_name == name:
-                return device
-        return None
+        if self._by_name is None:
+            # 名称重复时保留最先出现的设备，与逐个遍历的结果一致
+            by_name = {}
+            for device in self._devices.values():
+                if device.custom_name:
+                    by_name.setdefault(device.custom_name, device)
+            self._by_name = by_name
+        return self._by_name.get(name)
 
     def search(self, keyword: str) -> List[SavedDevice]:
         """搜索设备（按名称、ID、型号）"""
         keyword = keyword.lower()
-        results = []
-        for device in self._devices.values():
-            if (keyword in device.device_id.lower() or
-                keyword in device.custom_name.lower() or
-                keyword in device.model.lower() or
-                keyword in device.brand.lower()):
-                results.append(device)
-        return results
+        return [d for d in self._devices.values() if keyword in d._search_blob]
 
     def export_to_file(self, filepath: str):
         """导出设备列表"""
         data = {
             "devices": [d.to_dict() for d in self._devices.values()],
-            "exported_at": datetime.now().isoformat()
+            "exported_at": _now_iso()
         }
         with open(filepath, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
@@ -204,9 +364,10 @@ class DeviceRegistry:
             data = json.load(f)
 
         count = 0
-        for device_data in data.get("devices", []):
-            device = SavedDevice.from_dict(device_data)
-            self.add_or_update(device)
-            count += 1
+        with self.batch():
+            for device_data in data.get("devices", []):
+                device = SavedDevice.from_dict(device_data)
+                self.add_or_update(device)
+                count += 1
 
         return count
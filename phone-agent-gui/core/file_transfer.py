@@ -2,8 +2,12 @@
 文件传输管理器
 支持多文件上传、多种文件类型
 """
+import functools
 import os
+import shlex
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from typing import List, Tuple, Optional, Callable
 from enum import Enum
@@ -21,6 +25,73 @@ class FileType(Enum):
     OTHER = "other"
 
 
+# 文件扩展名到类型的映射
+_EXTENSION_MAP = {
+    # APK
+    ".apk": FileType.APK,
+    ".xapk": FileType.APK,
+
+    # 视频
+    ".mp4": FileType.VIDEO,
+    ".mkv": FileType.VIDEO,
+    ".avi": FileType.VIDEO,
+    ".mov": FileType.VIDEO,
+    ".wmv": FileType.VIDEO,
+    ".flv": FileType.VIDEO,
+    ".webm": FileType.VIDEO,
+    ".m4v": FileType.VIDEO,
+    ".3gp": FileType.VIDEO,
+
+    # 音频
+    ".mp3": FileType.AUDIO,
+    ".wav": FileType.AUDIO,
+    ".flac": FileType.AUDIO,
+    ".aac": FileType.AUDIO,
+    ".ogg": FileType.AUDIO,
+    ".wma": FileType.AUDIO,
+    ".m4a": FileType.AUDIO,
+
+    # 图片
+    ".jpg": FileType.IMAGE,
+    ".jpeg": FileType.IMAGE,
+    ".png": FileType.IMAGE,
+    ".gif": FileType.IMAGE,
+    ".bmp": FileType.IMAGE,
+    ".webp": FileType.IMAGE,
+    ".svg": FileType.IMAGE,
+
+    # 文档
+    ".pdf": FileType.DOCUMENT,
+    ".doc": FileType.DOCUMENT,
+    ".docx": FileType.DOCUMENT,
+    ".xls": FileType.DOCUMENT,
+    ".xlsx": FileType.DOCUMENT,
+    ".ppt": FileType.DOCUMENT,
+    ".pptx": FileType.DOCUMENT,
+    ".txt": FileType.DOCUMENT,
+    ".csv": FileType.DOCUMENT,
+    ".json": FileType.DOCUMENT,
+    ".xml": FileType.DOCUMENT,
+}
+
+# 文件类型到目标目录的映射
+_TARGET_DIRS = {
+    FileType.APK: None,  # APK 直接安装，不推送
+    FileType.VIDEO: "/sdcard/Movies/",
+    FileType.AUDIO: "/sdcard/Music/",
+    FileType.IMAGE: "/sdcard/Pictures/",
+    FileType.DOCUMENT: "/sdcard/Documents/",
+    FileType.OTHER: "/sdcard/Download/",
+}
+
+
+# 传输超时按每 10MB 一档递增
+_TIMEOUT_SLAB = 10 * 1024 * 1024
+
+# 文件大小显示格式，下标为 1024 的幂次
+_SIZE_FORMATS = ("{} B", "{:.1f} KB", "{:.1f} MB", "{:.2f} GB")
+
+
 @dataclass
 class FileInfo:
     """文件信息"""
@@ -33,14 +104,11 @@ class FileInfo:
     @property
     def size_display(self) -> str:
         """人类可读的文件大小"""
-        if self.size < 1024:
+        # 由 bit_length 直接算出单位档位，避免逐级比较
+        i = min(max(self.size.bit_length() - 1, 0) // 10, 3)
+        if not i:
             return f"{self.size} B"
-        elif self.size < 1024 * 1024:
-            return f"{self.size / 1024:.1f} KB"
-        elif self.size < 1024 * 1024 * 1024:
-            return f"{self.size / (1024 * 1024):.1f} MB"
-        else:
-            return f"{self.size / (1024 * 1024 * 1024):.2f} GB"
+        return _SIZE_FORMATS[i].format(self.size / (1 << (i * 10)))
 
     @property
     def action_display(self) -> str:
@@ -60,67 +128,34 @@ class TransferResult:
     device_id: str
 
 
+def _target_path(filepath: str, file_type: FileType) -> str:
+    """根据文件类型拼接设备上的目标路径（APK 返回空串）"""
+    target_dir = _TARGET_DIRS.get(file_type, "/sdcard/Download/")
+    if target_dir is None:
+        return ""  # APK 不需要目标路径
+    return f"{target_dir}{os.path.basename(filepath)}"
+
+
+def _make_file_info(filepath: str, size: int) -> FileInfo:
+    """由路径和大小构造 FileInfo，扩展名只解析一次"""
+    file_type = _EXTENSION_MAP.get(os.path.splitext(filepath)[1].lower(), FileType.OTHER)
+    return FileInfo(
+        path=filepath,
+        name=os.path.basename(filepath),
+        size=size,
+        file_type=file_type,
+        target_path=_target_path(filepath, file_type)
+    )
+
+
 class FileTransferManager:
     """文件传输管理器"""
 
     # 文件扩展名到类型的映射
-    EXTENSION_MAP = {
-        # APK
-        ".apk": FileType.APK,
-        ".xapk": FileType.APK,
-
-        # 视频
-        ".mp4": FileType.VIDEO,
-        ".mkv": FileType.VIDEO,
-        ".avi": FileType.VIDEO,
-        ".mov": FileType.VIDEO,
-        ".wmv": FileType.VIDEO,
-        ".flv": FileType.VIDEO,
-        ".webm": FileType.VIDEO,
-        ".m4v": FileType.VIDEO,
-        ".3gp": FileType.VIDEO,
-
-        # 音频
-        ".mp3": FileType.AUDIO,
-        ".wav": FileType.AUDIO,
-        ".flac": FileType.AUDIO,
-        ".aac": FileType.AUDIO,
-        ".ogg": FileType.AUDIO,
-        ".wma": FileType.AUDIO,
-        ".m4a": FileType.AUDIO,
-
-        # 图片
-        ".jpg": FileType.IMAGE,
-        ".jpeg": FileType.IMAGE,
-        ".png": FileType.IMAGE,
-        ".gif": FileType.IMAGE,
-        ".bmp": FileType.IMAGE,
-        ".webp": FileType.IMAGE,
-        ".svg": FileType.IMAGE,
-
-        # 文档
-        ".pdf": FileType.DOCUMENT,
-        ".doc": FileType.DOCUMENT,
-        ".docx": FileType.DOCUMENT,
-        ".xls": FileType.DOCUMENT,
-        ".xlsx": FileType.DOCUMENT,
-        ".ppt": FileType.DOCUMENT,
-        ".pptx": FileType.DOCUMENT,
-        ".txt": FileType.DOCUMENT,
-        ".csv": FileType.DOCUMENT,
-        ".json": FileType.DOCUMENT,
-        ".xml": FileType.DOCUMENT,
-    }
+    EXTENSION_MAP = _EXTENSION_MAP
 
     # 文件类型到目标目录的映射
-    TARGET_DIRS = {
-        FileType.APK: None,  # APK 直接安装，不推送
-        FileType.VIDEO: "/sdcard/Movies/",
-        FileType.AUDIO: "/sdcard/Music/",
-        FileType.IMAGE: "/sdcard/Pictures/",
-        FileType.DOCUMENT: "/sdcard/Documents/",
-        FileType.OTHER: "/sdcard/Download/",
-    }
+    TARGET_DIRS = _TARGET_DIRS
 
     # 支持的文件扩展名列表（用于 Gradio file_types）
     SUPPORTED_EXTENSIONS = list(EXTENSION_MAP.keys()) + [".zip", ".rar", ".7z"]
@@ -131,53 +166,57 @@ class FileTransferManager:
     def get_file_type(self, filepath: str) -> FileType:
         """根据文件扩展名获取文件类型"""
         ext = os.path.splitext(filepath)[1].lower()
-        return self.EXTENSION_MAP.get(ext, FileType.OTHER)
+        return _EXTENSION_MAP.get(ext, FileType.OTHER)
 
     def get_target_path(self, filepath: str) -> str:
         """获取文件在设备上的目标路径"""
-        file_type = self.get_file_type(filepath)
-        target_dir = self.TARGET_DIRS.get(file_type, "/sdcard/Download/")
-        if target_dir is None:
-            return ""  # APK 不需要目标路径
-        filename = os.path.basename(filepath)
-        return f"{target_dir}{filename}"
+        return _target_path(filepath, self.get_file_type(filepath))
 
     def analyze_file(self, filepath: str) -> Optional[FileInfo]:
         """分析文件，返回文件信息"""
-        if not os.path.exists(filepath):
-            return None
-
         try:
-            size = os.path.getsize(filepath)
-            name = os.path.basename(filepath)
-            file_type = self.get_file_type(filepath)
-            target_path = self.get_target_path(filepath)
-
-            return FileInfo(
-                path=filepath,
-                name=name,
-                size=size,
-                file_type=file_type,
-                target_path=target_path
-            )
+            size = os.stat(filepath).st_size
         except Exception:
             return None
+        return _make_file_info(filepath, size)
 
     def analyze_files(self, filepaths: List[str]) -> List[FileInfo]:
         """批量分析文件"""
+        # 同一目录下有多个文件时，用一次 scandir 读取目录项，复用 DirEntry 的 stat 结果
+        by_dir = {}
+        for filepath in filepaths:
+            if isinstance(filepath, str):
+                by_dir.setdefault(os.path.dirname(filepath), []).append(filepath)
+
+        sizes = {}
+        for directory, paths in by_dir.items():
+            if len(paths) < 2:
+                continue
+            wanted = {os.path.basename(p) for p in paths}
+            try:
+                with os.scandir(directory or ".") as it:
+                    for entry in it:
+                        if entry.name in wanted:
+                            sizes[os.path.join(directory, entry.name)] = entry.stat().st_size
+            except OSError:
+                continue
+
         results = []
         for filepath in filepaths:
-            info = self.analyze_file(filepath)
+            size = sizes.get(filepath)
+            if size is None:
+                info = self.analyze_file(filepath)
+            else:
+                info = _make_file_info(filepath, size)
             if info:
                 results.append(info)
         return results
 
-    def _calculate_timeout(self, file_size: int) -> int:
+    @staticmethod
+    def _calculate_timeout(file_size: int) -> int:
         """根据文件大小计算超时时间"""
         # 基础60秒 + 每10MB额外30秒，最长10分钟
-        size_mb = file_size / (1024 * 1024)
-        timeout = 60 + int(size_mb / 10) * 30
-        return min(timeout, 600)
+        return min(60 + (file_size // _TIMEOUT_SLAB) * 30, 600)
 
     def install_apk(self, filepath: str, device_id: str = None) -> Tuple[bool, str]:
         """安装APK文件"""
@@ -197,19 +236,31 @@ class FileTransferManager:
             return True, "安装成功"
         return False, output or "安装失败"
 
-    def push_file(self, filepath: str, target_path: str, device_id: str = None) -> Tuple[bool, str]:
-        """推送文件到设备"""
+    def _ensure_dirs(self, device_id: str, dirs) -> None:
+        """一次 adb shell 调用创建所有目标目录"""
+        dirs = sorted(d for d in dirs if d)
+        if not dirs:
+            return
+        args = []
+        if device_id:
+            args.extend(["-s", device_id])
+        args.extend(["shell", "mkdir", "-p", *dirs])
+        self.adb_helper.run_command(args)
+
+    def push_file(
+        self,
+        filepath: str,
+        target_path: str,
+        device_id: str = None,
+        ensure_dir: bool = True
+    ) -> Tuple[bool, str]:
+        """推送文件到设备（批量传输时目录已统一创建，可传 ensure_dir=False）"""
         if not os.path.exists(filepath):
             return False, "文件不存在"
 
         # 确保目标目录存在
-        target_dir = os.path.dirname(target_path)
-        if target_dir:
-            mkdir_args = []
-            if device_id:
-                mkdir_args.extend(["-s", device_id])
-            mkdir_args.extend(["shell", "mkdir", "-p", target_dir])
-            self.adb_helper.run_command(mkdir_args)
+        if ensure_dir:
+            self._ensure_dirs(device_id, {os.path.dirname(target_path)})
 
         # 推送文件
         args = []
@@ -224,6 +275,18 @@ class FileTransferManager:
         if not success:
             return False, output or "推送失败"
 
+        self._sync_and_scan([(target_path, self.get_file_type(filepath))], device_id)
+
+        return True, f"已推送到 {target_path}"
+
+    def _sync_and_scan(self, pushed: List[Tuple[str, FileType]], device_id: str = None):
+        """
+        推送完成后同步文件系统，并触发媒体扫描让文件出现在相册/播放器中
+
+        Args:
+            pushed: 已推送文件的 (目标路径, 文件类型) 列表
+            device_id: 设备ID
+        """
         # 同步确保文件完全写入
         sync_args = []
         if device_id:
@@ -231,21 +294,19 @@ class FileTransferManager:
         sync_args.extend(["shell", "sync"])
         self.adb_helper.run_command(sync_args, timeout=10)
 
-        # 触发媒体扫描，让文件出现在相册/播放器中
-        file_type = self.get_file_type(filepath)
-        if file_type in (FileType.VIDEO, FileType.AUDIO, FileType.IMAGE):
+        # 使用 am broadcast 触发媒体扫描（多个文件合并为一次 shell 调用）
+        scan_cmds = [
+            "am broadcast -a android.intent.action.MEDIA_SCANNER_SCAN_FILE -d "
+            + shlex.quote(f"file://{target_path}")
+            for target_path, file_type in pushed
+            if file_type in (FileType.VIDEO, FileType.AUDIO, FileType.IMAGE)
+        ]
+        if scan_cmds:
             scan_args = []
             if device_id:
                 scan_args.extend(["-s", device_id])
-            # 使用 am broadcast 触发媒体扫描
-            scan_args.extend([
-                "shell", "am", "broadcast",
-                "-a", "android.intent.action.MEDIA_SCANNER_SCAN_FILE",
-                "-d", f"file://{target_path}"
-            ])
-            self.adb_helper.run_command(scan_args, timeout=10)
-
-        return True, f"已推送到 {target_path}"
+            scan_args.extend(["shell", " ; ".join(scan_cmds)])
+            self.adb_helper.run_command(scan_args, timeout=10 + 2 * (len(scan_cmds) - 1))
 
     def transfer_file(self, file_info: FileInfo, device_id: str = None) -> TransferResult:
         """传输单个文件（根据类型决定安装或推送）"""
@@ -261,32 +322,132 @@ class FileTransferManager:
             device_id=device_id or "default"
         )
 
+    def _push_group(
+        self,
+        file_infos: List[FileInfo],
+        target_dir: str,
+        device_id: str = None
+    ) -> List[TransferResult]:
+        """将同一目标目录下的多个文件合并为一次 adb push 推送（目标目录需已存在）"""
+        device_label = device_id or "default"
+        if len(file_infos) == 1:
+            file_info = file_infos[0]
+            success, message = self.push_file(
+                file_info.path, file_info.target_path, device_id, ensure_dir=False
+            )
+            return [TransferResult(file_info, success, message, device_label)]
+
+        results: List[Optional[TransferResult]] = [None] * len(file_infos)
+        pending = []
+        for i, file_info in enumerate(file_infos):
+            if os.path.exists(file_info.path):
+                pending.append((i, file_info))
+            else:
+                results[i] = TransferResult(file_info, False, "文件不存在", device_label)
+
+        if pending:
+            # 一次 adb push 多个源文件，超时为各文件超时之和
+            args = []
+            if device_id:
+                args.extend(["-s", device_id])
+            args.append("push")
+            args.extend(fi.path for _, fi in pending)
+            args.append(target_dir.rstrip("/") + "/")
+            timeout = sum(self._calculate_timeout(fi.size) for _, fi in pending)
+
+            success, output = self.adb_helper.run_command(args, timeout=timeout)
+
+            # adb 对失败的文件会输出 "failed to copy '<path>' ..."，据此区分每个文件的结果
+            failed = set()
+            if not success:
+                failed = {i for i, fi in pending if f"'{fi.path}'" in output}
+                if not failed:
+                    failed = {i for i, _ in pending}
+
+            pushed = []
+            for i, file_info in pending:
+                if i in failed:
+                    results[i] = TransferResult(file_info, False, output or "推送失败", device_label)
+                else:
+                    pushed.append(file_info)
+                    results[i] = TransferResult(
+                        file_info, True, f"已推送到 {file_info.target_path}", device_label
+                    )
+
+            if pushed:
+                self._sync_and_scan(
+                    [(fi.target_path, fi.file_type) for fi in pushed], device_id
+                )
+
+        return results
+
     def transfer_files(
         self,
         file_infos: List[FileInfo],
         device_id: str = None,
-        on_progress: Callable[[int, int, FileInfo, bool, str], None] = None
+        on_progress: Callable[[int, int, FileInfo, bool, str], None] = None,
+        max_workers: int = 4
     ) -> List[TransferResult]:
         """
         批量传输文件
 
+        非 APK 文件按目标目录分组，每组一次 adb push；APK 逐个安装。
+        各组/各 APK 在线程池中并发执行。
+
         Args:
             file_infos: 文件信息列表
             device_id: 设备ID
-            on_progress: 进度回调 (当前索引, 总数, 文件信息, 是否成功, 消息)
+            on_progress: 进度回调 (已完成数, 总数, 文件信息, 是否成功, 消息)，按完成顺序在调用线程中触发
+            max_workers: 最大并发传输数
 
         Returns:
-            传输结果列表
+            传输结果列表（与 file_infos 顺序一致）
         """
-        results = []
         total = len(file_infos)
+        results: List[Optional[TransferResult]] = [None] * total
 
+        # 任务: (文件下标列表, 待传输的文件列表, 目标目录；None 表示 APK 安装)
+        tasks = []
+        groups = {}
         for i, file_info in enumerate(file_infos):
-            result = self.transfer_file(file_info, device_id)
-            results.append(result)
+            if file_info.file_type == FileType.APK:
+                tasks.append(([i], [file_info], None))
+            else:
+                target_dir = os.path.dirname(file_info.target_path)
+                if target_dir not in groups:
+                    groups[target_dir] = ([], [])
+                    tasks.append((groups[target_dir][0], groups[target_dir][1], target_dir))
+                groups[target_dir][0].append(i)
+                groups[target_dir][1].append(file_info)
+
+        # 所有目标目录一次性创建
+        self._ensure_dirs(device_id, groups.keys())
+
+        def run_task(task) -> List[TransferResult]:
+            _, infos, target_dir = task
+            if target_dir is None:
+                return [self.transfer_file(infos[0], device_id)]
+            return self._push_group(infos, target_dir, device_id)
+
+        done = 0
+
+        def collect(task, task_results: List[TransferResult]):
+            nonlocal done
+            for i, result in zip(task[0], task_results):
+                results[i] = result
+                done += 1
+                if on_progress:
+                    on_progress(done, total, result.file_info, result.success, result.message)
+
+        if len(tasks) <= 1 or max_workers <= 1:
+            for task in tasks:
+                collect(task, run_task(task))
+            return results
 
-            if on_progress:
-                on_progress(i + 1, total, file_info, result.success, result.message)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+            futures = {executor.submit(run_task, task): task for task in tasks}
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
 
         return results
 
@@ -294,35 +455,40 @@ class FileTransferManager:
         self,
         file_infos: List[FileInfo],
         device_ids: List[str],
-        on_progress: Callable[[str, int, int, FileInfo, bool, str], None] = None
+        on_progress: Callable[[str, int, int, FileInfo, bool, str], None] = None,
+        max_devices: int = 4
     ) -> dict:
         """
         向多个设备传输文件
 
+        各设备在线程池中并发传输，设备之间互不依赖。
+
         Args:
             file_infos: 文件信息列表
             device_ids: 设备ID列表
-            on_progress: 进度回调 (设备ID, 当前索引, 总数, 文件信息, 是否成功, 消息)
+            on_progress: 进度回调 (设备ID, 当前索引, 总数, 文件信息, 是否成功, 消息)，
+                由各设备的工作线程触发，回调之间互斥
+            max_devices: 最大并发设备数
 
         Returns:
-            {device_id: [TransferResult, ...], ...}
+            {device_id: [TransferResult, ...], ...}（与 device_ids 顺序一致）
         """
-        all_results = {}
+        if not device_ids:
+            return {}
 
-        for device_id in device_ids:
-            device_results = []
-            total = len(file_infos)
+        progress_lock = threading.Lock()
 
-            for i, file_info in enumerate(file_infos):
-                result = self.transfer_file(file_info, device_id)
-                device_results.append(result)
-
-                if on_progress:
-                    on_progress(device_id, i + 1, total, file_info, result.success, result.message)
+        def locked_progress(device_id, index, total, file_info, success, message):
+            with progress_lock:
+                on_progress(device_id, index, total, file_info, success, message)
 
-            all_results[device_id] = device_results
+        def run_device(device_id: str) -> List[TransferResult]:
+            device_progress = functools.partial(locked_progress, device_id) if on_progress else None
+            return self.transfer_files(file_infos, device_id, device_progress)
 
-        return all_results
+        with ThreadPoolExecutor(max_workers=min(max_devices, len(device_ids))) as executor:
+            results = executor.map(run_device, device_ids)
+            return dict(zip(device_ids, results))
 
     def get_supported_extensions_display(self) -> str:
         """获取支持的文件类型说明"""
@@ -3,16 +3,76 @@ MJPEG 流服务器
 提供实时视频流，绕过 Gradio 的事件机制
 同时提供点击/滑动等操作的 API
 """
+import functools
 import io
 import json
+import logging
+import socket
 import threading
 import time
 import urllib.parse
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from typing import Optional, Callable, Dict, Any
 from .screen_stream import get_screen_streamer
 
 
+# 逐帧/逐请求的调试信息走 logging.debug，默认级别下不做格式化和输出
+logger = logging.getLogger(__name__)
+
+# multipart 每帧的分隔符和头部模板
+_FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+
+
+@functools.lru_cache(maxsize=1)
+def _get_loading_frame_bytes() -> Optional[bytes]:
+    """生成加载占位帧（内容固定，只渲染一次）"""
+    try:
+        from PIL import Image, ImageDraw
+        # 创建一个简单的加载画面
+        img = Image.new('RGB', (360, 640), color=(30, 30, 30))
+        draw = ImageDraw.Draw(img)
+        # 绘制加载文本
+        text = "Loading..."
+        # 获取文本大小
+        bbox = draw.textbbox((0, 0), text)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+        x = (360 - text_width) // 2
+        y = (640 - text_height) // 2
+        draw.text((x, y), text, fill=(128, 128, 128))
+        # 转为 JPEG
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=50)
+        return buffer.getvalue()
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_loading_chunk() -> Optional[bytes]:
+    """加载占位帧对应的完整 multipart 分块，可直接写出"""
+    frame = _get_loading_frame_bytes()
+    if not frame:
+        return None
+    return b''.join((_FRAME_HEADER % len(frame), frame, b'\r\n'))
+
+
+# Windows 的 socket 没有 sendmsg，回退为拼接后写出
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+
+def _sendmsg_all(sock: socket.socket, buffers):
+    """用 sendmsg 发送多个缓冲区，处理部分发送直到全部写出"""
+    buffers = [memoryview(b) for b in buffers]
+    while buffers:
+        sent = sock.sendmsg(buffers)
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers.pop(0)
+        if buffers and sent:
+            buffers[0] = buffers[0][sent:]
+
+
 # 全局操作回调
 _operation_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
 
@@ -26,6 +86,18 @@ def set_operation_callback(callback: Callable[[str, Dict[str, Any]], None]):
 class MJPEGHandler(BaseHTTPRequestHandler):
     """MJPEG 流处理器"""
 
+    # 同时观看视频流的连接上限，超出时返回 503
+    MAX_VIEWERS = 8
+    _viewer_slots = threading.BoundedSemaphore(MAX_VIEWERS)
+
+    def setup(self):
+        """关闭 Nagle 算法，每帧写出后立即发送，避免最多 40ms 的合包延迟"""
+        super().setup()
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
     def log_message(self, format, *args):
         """禁用日志输出"""
         pass
@@ -59,7 +131,20 @@ class MJPEGHandler(BaseHTTPRequestHandler):
 
     def _handle_stream(self):
         """处理视频流请求"""
-        print("[MJPEG] 收到 /stream 请求")
+        logger.debug("[MJPEG] 收到 /stream 请求")
+        if not self._viewer_slots.acquire(blocking=False):
+            logger.warning("[MJPEG] 观看连接数已达上限，拒绝请求")
+            self.send_response(503)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+        try:
+            self._stream_frames()
+        finally:
+            self._viewer_slots.release()
+
+    def _stream_frames(self):
+        """持续推送帧直到连接断开"""
         self.send_response(200)
         self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
         self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
@@ -80,73 +165,57 @@ class MJPEGHandler(BaseHTTPRequestHandler):
 
                 # 每100次循环打印一次状态
                 if loop_count % 100 == 0:
-                    print(f"[MJPEG] 循环 #{loop_count}, running={streamer.is_running()}, frame_id={streamer._frame_id}, last_id={last_frame_id}")
+                    logger.debug(
+                        "[MJPEG] 循环 #%d, running=%s, frame_id=%d, last_id=%d",
+                        loop_count, streamer.is_running(), streamer._frame_id, last_frame_id,
+                    )
 
                 if not streamer.is_running():
-                    print("[MJPEG] 等待 streamer 启动...")
+                    logger.debug("[MJPEG] 等待 streamer 启动...")
                     time.sleep(0.1)
                     continue
 
-                frame_bytes = streamer.get_frame_bytes()
+                # 阻塞等待新帧（最多 1 秒），取代固定间隔轮询
+                streamer.wait_for_frame(last_frame_id, timeout=1.0)
+                # 帧ID与数据同时取出，保证发送的正是该ID对应的帧
+                current_id, frame_bytes = streamer.get_frame_snapshot()
                 if frame_bytes:
-                    current_id = streamer._frame_id
                     if current_id > last_frame_id:
                         last_frame_id = current_id
                         self._send_frame(frame_bytes)
                         frame_count += 1
                         if frame_count <= 5:
-                            print(f"[MJPEG] 发送帧 #{frame_count}, 大小: {len(frame_bytes)} 字节, frame_id={current_id}")
+                            logger.debug(
+                                "[MJPEG] 发送帧 #%d, 大小: %d 字节, frame_id=%d",
+                                frame_count, len(frame_bytes), current_id,
+                            )
                         loading_sent = False
                 else:
                     if not loading_sent or (time.time() - wait_start) > 1.0:
-                        print("[MJPEG] 没有帧数据，发送 loading 占位帧")
-                        loading_frame = self._create_loading_frame()
-                        if loading_frame:
-                            self._send_frame(loading_frame)
+                        logger.debug("[MJPEG] 没有帧数据，发送 loading 占位帧")
+                        loading_chunk = _get_loading_chunk()
+                        if loading_chunk:
+                            self.wfile.write(loading_chunk)
+                            self.wfile.flush()
                             loading_sent = True
                             wait_start = time.time()
 
-                time.sleep(0.04)
-
         except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError) as e:
-            print(f"[MJPEG] 连接断开: {e}")
+            logger.debug("[MJPEG] 连接断开: %s", e)
         except Exception as e:
             print(f"[MJPEG] 异常: {e}")
             import traceback
             traceback.print_exc()
 
     def _send_frame(self, frame_bytes: bytes):
-        """发送单帧"""
-        self.wfile.write(b'--frame\r\n')
-        self.wfile.write(b'Content-Type: image/jpeg\r\n')
-        self.wfile.write(f'Content-Length: {len(frame_bytes)}\r\n'.encode())
-        self.wfile.write(b'\r\n')
-        self.wfile.write(frame_bytes)
-        self.wfile.write(b'\r\n')
-        self.wfile.flush()
-
-    def _create_loading_frame(self) -> Optional[bytes]:
-        """创建加载占位帧"""
-        try:
-            from PIL import Image, ImageDraw
-            # 创建一个简单的加载画面
-            img = Image.new('RGB', (360, 640), color=(30, 30, 30))
-            draw = ImageDraw.Draw(img)
-            # 绘制加载文本
-            text = "Loading..."
-            # 获取文本大小
-            bbox = draw.textbbox((0, 0), text)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            x = (360 - text_width) // 2
-            y = (640 - text_height) // 2
-            draw.text((x, y), text, fill=(128, 128, 128))
-            # 转为 JPEG
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=50)
-            return buffer.getvalue()
-        except Exception:
-            return None
+        """发送单帧（分隔符、头部、数据一次发出）"""
+        header = _FRAME_HEADER % len(frame_bytes)
+        if _HAS_SENDMSG:
+            # 分散写：直接发送三段缓冲区，省去拼接整帧的内存拷贝
+            _sendmsg_all(self.connection, [header, memoryview(frame_bytes), b'\r\n'])
+        else:
+            self.wfile.write(b''.join((header, frame_bytes, b'\r\n')))
+            self.wfile.flush()
 
     def _handle_status(self):
         """返回流状态"""
@@ -174,13 +243,13 @@ class MJPEGHandler(BaseHTTPRequestHandler):
         except json.JSONDecodeError:
             data = {}
 
-        print(f"[MJPEG] 收到操作请求: {op_type}, 数据: {data}")
+        logger.debug("[MJPEG] 收到操作请求: %s, 数据: %s", op_type, data)
 
         # 调用回调
         if _operation_callback:
             try:
                 _operation_callback(op_type, data)
-                print(f"[MJPEG] 操作执行成功: {op_type}")
+                logger.debug("[MJPEG] 操作执行成功: %s", op_type)
                 self.send_response(200)
             except Exception as e:
                 print(f"[MJPEG] 操作执行失败: {op_type}, 错误: {e}")
@@ -210,9 +279,10 @@ class MJPEGHandler(BaseHTTPRequestHandler):
         self.wfile.write(b'<html><body><img src="/stream" /></body></html>')
 
 
-class ReuseHTTPServer(HTTPServer):
-    """允许端口复用的 HTTP 服务器"""
+class ReuseHTTPServer(ThreadingHTTPServer):
+    """允许端口复用的多线程 HTTP 服务器（每个连接一个线程，多个观看者互不阻塞）"""
     allow_reuse_address = True
+    daemon_threads = True
 
 
 class MJPEGServer:
@@ -220,7 +290,7 @@ class MJPEGServer:
 
     def __init__(self, port: int = 8765):
         self.port = port
-        self._server: Optional[HTTPServer] = None
+        self._server: Optional[ThreadingHTTPServer] = None
         self._thread: Optional[threading.Thread] = None
         self._running = False
 
@@ -4,9 +4,10 @@
 
 特点：
 1. 并行预取：2个工作线程轮流截图，提高帧率
-2. 始终刷新：Timer 持续读取最新帧显示
-3. 稳定可靠：每帧独立请求，失败可重试
-4. PNG 格式：设备端压缩，减少传输量
+2. 按需解码：只缓存 PNG 字节，界面读取时才解码
+3. 始终刷新：Timer 持续读取最新帧显示
+4. 常驻 shell：每个工作线程复用一个 adb shell 会话截图，失败时回退为单次请求
+5. PNG 格式：设备端压缩，减少传输量
 """
 
 import io
@@ -17,12 +18,59 @@ import threading
 import time
 import platform
 import shutil
-from typing import Optional, Tuple, List
+import struct
+from typing import Dict, Optional, Tuple, List
 from PIL import Image
 from dataclasses import dataclass
 from collections import deque
 
 
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 常驻 shell 中每次截图后输出的结束标记
+_CAPTURE_END_MARKER = b"__SCREENCAP_END__"
+_CAPTURE_COMMAND = b"screencap -p 2>/dev/null; echo " + _CAPTURE_END_MARKER + b"\n"
+
+
+def _read_exact(stream, size: int) -> bytes:
+    """从管道读取恰好 size 字节，遇到 EOF 抛出 EOFError"""
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError("shell 已关闭")
+    return data
+
+
+def _read_png_frame(stream) -> Optional[bytes]:
+    """
+    从常驻 shell 的输出中读取一帧 PNG 并消费结束标记
+
+    按 PNG 分块长度精确读取，不需要在二进制数据中搜索分隔符。
+    screencap 没有输出 PNG 时返回 None。
+    """
+    head = _read_exact(stream, 8)
+    if head != _PNG_SIGNATURE:
+        # 不是 PNG：丢弃输出直到结束标记
+        buf = head
+        while _CAPTURE_END_MARKER not in buf:
+            line = stream.readline()
+            if not line:
+                raise EOFError("shell 已关闭")
+            buf += line
+        return None
+
+    parts = [head]
+    while True:
+        chunk_head = _read_exact(stream, 8)
+        length, chunk_type = struct.unpack('>I4s', chunk_head)
+        parts.append(chunk_head)
+        parts.append(_read_exact(stream, length + 4))  # 数据 + CRC
+        if chunk_type == b'IEND':
+            break
+
+    if _CAPTURE_END_MARKER not in stream.readline():
+        raise EOFError("截图输出格式异常")
+    return b"".join(parts)
+
+
 @dataclass
 class CaptureStats:
     """捕获统计信息"""
@@ -88,9 +136,10 @@ class RemoteScreenCapture:
         self._paused = False
         self._device_id: Optional[str] = None
 
-        # 帧缓存
+        # 帧缓存（PNG 字节；PIL Image 在读取时才解码并缓存）
         self._latest_frame: Optional[bytes] = None
         self._latest_image: Optional[Image.Image] = None
+        self._image_frame_id = 0  # _latest_image 对应的帧ID
         self._frame_lock = threading.Lock()
         self._frame_id = 0
         self._last_read_id = 0
@@ -98,7 +147,11 @@ class RemoteScreenCapture:
         # 工作线程
         self._workers: List[threading.Thread] = []
         self._num_workers = 2  # 双线程并行预取
-        self._semaphore = threading.Semaphore(2)  # 限制并发
+
+        # 常驻 shell（每个工作线程一个，只在本线程内使用）
+        self._shells: Dict[int, subprocess.Popen] = {}
+        self._shells_lock = threading.Lock()
+        self._shell_disabled = False  # 设备不支持时回退为单次截图
 
         # 配置
         self._timeout = 5.0  # 远程场景需要更长超时
@@ -150,19 +203,95 @@ class RemoteScreenCapture:
         except Exception as e:
             return False, f"设备验证失败: {e}"
 
-    def _capture_one_frame(self) -> Optional[bytes]:
+    def _open_shell(self) -> subprocess.Popen:
+        """启动不分配 pty 的 adb shell，输出为原始二进制"""
+        kwargs = {}
+        if platform.system() == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        return subprocess.Popen(
+            [self._adb_path, "-s", self._device_id, "shell", "-T"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            **kwargs
+        )
+
+    def _close_shell(self, worker_id: int):
+        """关闭指定工作线程的常驻 shell"""
+        with self._shells_lock:
+            proc = self._shells.pop(worker_id, None)
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            proc.kill()
+            proc.wait(timeout=2)
+        except Exception:
+            pass
+
+    def _close_shells(self):
+        """关闭所有常驻 shell"""
+        with self._shells_lock:
+            worker_ids = list(self._shells.keys())
+        for worker_id in worker_ids:
+            self._close_shell(worker_id)
+
+    def _capture_via_shell(self, worker_id: int) -> Optional[bytes]:
+        """
+        在工作线程的常驻 shell 中截图，省去每帧启动 adb 进程的开销
+
+        Returns:
+            PNG 图像字节；shell 不可用时抛出异常，由调用方回退
+        """
+        with self._shells_lock:
+            proc = self._shells.get(worker_id)
+        if proc is None or proc.poll() is not None:
+            proc = self._open_shell()
+            with self._shells_lock:
+                self._shells[worker_id] = proc
+
+        # 超时直接结束 shell，让阻塞的读取返回 EOF
+        watchdog = threading.Timer(self._timeout, proc.kill)
+        watchdog.start()
+        try:
+            proc.stdin.write(_CAPTURE_COMMAND)
+            proc.stdin.flush()
+            return _read_png_frame(proc.stdout)
+        except Exception:
+            if not watchdog.is_alive():
+                self._stats.last_error = "截图超时"
+            self._close_shell(worker_id)
+            raise
+        finally:
+            watchdog.cancel()
+
+    def _capture_one_frame(self, worker_id: Optional[int] = None) -> Optional[bytes]:
         """
         捕获一帧截图
 
         使用 PNG 格式：设备端压缩，减少传输量
         对于远程 ADB，这比原始格式更快
 
+        Args:
+            worker_id: 工作线程编号，提供时优先使用该线程的常驻 shell
+
         Returns:
             PNG 图像字节，失败返回 None
         """
         if not self._adb_path or not self._device_id:
             return None
 
+        if worker_id is not None and not self._shell_disabled:
+            try:
+                return self._capture_via_shell(worker_id)
+            except Exception:
+                # 常驻 shell 从未成功过（如 adb 不支持 -T），本次会话不再尝试
+                if self._stats.total_frames == 0:
+                    self._shell_disabled = True
+
         cmd = [
             self._adb_path,
             "-s", self._device_id,
@@ -202,15 +331,15 @@ class RemoteScreenCapture:
             self._stats.last_error = str(e)
             return None
 
-    def _process_frame(self, png_data: bytes) -> Tuple[Optional[bytes], Optional[Image.Image]]:
+    def _decode_frame(self, png_data: bytes) -> Optional[Image.Image]:
         """
-        处理帧数据：解析 PNG，转换为 JPEG（减少内存占用）
+        解析 PNG 帧为 RGB 图像
 
         Args:
             png_data: PNG 图像字节
 
         Returns:
-            (JPEG 字节, PIL Image)
+            PIL Image，失败返回 None
         """
         try:
             img = Image.open(io.BytesIO(png_data))
@@ -218,17 +347,20 @@ class RemoteScreenCapture:
             # 转换为 RGB（去掉 alpha 通道）
             if img.mode != 'RGB':
                 img = img.convert('RGB')
+            else:
+                img.load()
 
-            # 转为 JPEG 用于缓存（更小的内存占用）
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=75)
-            jpeg_data = buffer.getvalue()
-
-            return jpeg_data, img
+            return img
 
         except Exception as e:
             self._stats.last_error = f"图像处理失败: {e}"
-            return None, None
+            return None
+
+    def _publish_frame(self, png_data: bytes):
+        """更新最新帧（只保存 PNG 字节，解码推迟到读取时）"""
+        with self._frame_lock:
+            self._latest_frame = png_data
+            self._frame_id += 1
 
     def _worker_loop(self, worker_id: int):
         """
@@ -243,44 +375,28 @@ class RemoteScreenCapture:
                 time.sleep(0.1)
                 continue
 
-            # 获取信号量，限制并发
-            self._semaphore.acquire()
+            # 捕获一帧
+            start_time = time.time()
+            png_data = self._capture_one_frame(worker_id)
 
-            try:
-                if not self._running:
-                    break
-
-                # 捕获一帧
-                start_time = time.time()
-                png_data = self._capture_one_frame()
-
-                if png_data:
-                    # 处理帧
-                    jpeg_data, img = self._process_frame(png_data)
-
-                    if img:
-                        # 更新最新帧
-                        with self._frame_lock:
-                            self._latest_frame = jpeg_data
-                            self._latest_image = img
-                            self._frame_id += 1
-
-                        # 更新统计
-                        self._fps_counter.tick()
-                        self._stats.total_frames += 1
-                        self._stats.last_capture_time = time.time() - start_time
-                        self._consecutive_errors = 0
-                else:
-                    # 失败处理
-                    self._consecutive_errors += 1
-                    self._stats.error_count += 1
-
-                    if self._consecutive_errors >= self._max_consecutive_errors:
-                        self._stats.last_error = "连续截图失败，请检查设备连接"
-                        time.sleep(self._error_backoff)
-
-            finally:
-                self._semaphore.release()
+            if png_data:
+                self._publish_frame(png_data)
+
+                # 更新统计
+                self._fps_counter.tick()
+                self._stats.total_frames += 1
+                self._stats.last_capture_time = time.time() - start_time
+                self._consecutive_errors = 0
+            else:
+                # 失败处理
+                self._consecutive_errors += 1
+                self._stats.error_count += 1
+
+                if self._consecutive_errors >= self._max_consecutive_errors:
+                    self._stats.last_error = "连续截图失败，请检查设备连接"
+                    time.sleep(self._error_backoff)
+
+        self._close_shell(worker_id)
 
     def start(self, device_id: str) -> Tuple[bool, str, Optional[Image.Image]]:
         """
@@ -296,6 +412,7 @@ class RemoteScreenCapture:
             self.stop()
 
         self._device_id = device_id
+        self._shell_disabled = False
 
         # 验证设备
         ok, msg = self._verify_device()
@@ -306,13 +423,8 @@ class RemoteScreenCapture:
         first_frame = None
         png_data = self._capture_one_frame()
         if png_data:
-            jpeg_data, img = self._process_frame(png_data)
-            if img:
-                with self._frame_lock:
-                    self._latest_frame = jpeg_data
-                    self._latest_image = img
-                    self._frame_id += 1
-                first_frame = img
+            self._publish_frame(png_data)
+            first_frame = self.get_frame()
 
         if not first_frame:
             return False, "无法获取首帧截图", None
@@ -351,6 +463,7 @@ class RemoteScreenCapture:
                 worker.join(timeout=2)
 
         self._workers = []
+        self._close_shells()
 
         return True, "捕获已停止"
 
@@ -377,8 +490,7 @@ class RemoteScreenCapture:
         Returns:
             PIL Image 或 None
         """
-        with self._frame_lock:
-            return self._latest_image
+        return self._get_latest_image()
 
     def get_frame_if_new(self) -> Optional[Image.Image]:
         """
@@ -388,10 +500,31 @@ class RemoteScreenCapture:
             PIL Image 或 None
         """
         with self._frame_lock:
-            if self._frame_id > self._last_read_id:
-                self._last_read_id = self._frame_id
+            if self._frame_id <= self._last_read_id:
+                return None
+            self._last_read_id = self._frame_id
+        return self._get_latest_image()
+
+    def _get_latest_image(self) -> Optional[Image.Image]:
+        """返回最新帧的 PIL Image，尚未解码时在锁外解码并缓存"""
+        with self._frame_lock:
+            frame_id = self._frame_id
+            if self._image_frame_id == frame_id:
                 return self._latest_image
-        return None
+            png_data = self._latest_frame
+
+        if not png_data:
+            return None
+        img = self._decode_frame(png_data)
+        if img is None:
+            return None
+
+        with self._frame_lock:
+            # 解码期间没有更新的图像写入时才缓存
+            if frame_id > self._image_frame_id:
+                self._latest_image = img
+                self._image_frame_id = frame_id
+        return img
 
     def get_stats(self) -> CaptureStats:
         """获取统计信息"""
@@ -13,6 +13,32 @@ import struct
 from typing import Optional, Tuple
 from PIL import Image
 
+try:
+    # 可选依赖：PyTurboJPEG 使用 libjpeg-turbo 的 SIMD 编码，未安装时回退到 Pillow
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_RGBX, TJSAMP_420
+
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
+
+# 截图模式的 JPEG 质量
+_JPEG_QUALITY = 75
+
+
+def _encode_rgba_jpeg(pixels: bytes, width: int, height: int) -> bytes:
+    """将 screencap 原始 RGBA 像素编码为 JPEG"""
+    if _turbo_jpeg is not None:
+        frame = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+        return _turbo_jpeg.encode(
+            frame, quality=_JPEG_QUALITY, pixel_format=TJPF_RGBX, jpeg_subsample=TJSAMP_420
+        )
+    # 直接按 RGBX 解码为 RGB，省去 RGBA -> RGB 的整帧转换
+    img = Image.frombuffer('RGB', (width, height), pixels, 'raw', 'RGBX', 0, 1)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=_JPEG_QUALITY)
+    return buffer.getvalue()
+
 
 def _get_base_path() -> str:
     """获取应用基础路径，兼容 PyInstaller 打包"""
@@ -41,6 +67,8 @@ class ScreenStreamer:
         self._capture_thread: Optional[threading.Thread] = None
         self._latest_frame: Optional[bytes] = None
         self._frame_lock = threading.Lock()
+        # 新帧到达时唤醒等待者（与 _frame_lock 共用同一把锁）
+        self._frame_cond = threading.Condition(self._frame_lock)
         self._running = False
         self._device_id: Optional[str] = None
         self._error_message: Optional[str] = None
@@ -196,10 +224,7 @@ class ScreenStreamer:
                     frame = jpeg_buffer[start:end + 2]
                     jpeg_buffer = jpeg_buffer[end + 2:]
 
-                    with self._frame_lock:
-                        self._latest_frame = frame
-                        self._frame_id += 1
-                        self._cached_image = None  # 清除缓存
+                    self._publish_frame(frame)
 
         except Exception as e:
             self._error_message = f"scrcpy 流错误: {e}，尝试 screenrecord 模式"
@@ -334,10 +359,7 @@ class ScreenStreamer:
                     frame = jpeg_buffer[start:end + 2]
                     jpeg_buffer = jpeg_buffer[end + 2:]
 
-                    with self._frame_lock:
-                        self._latest_frame = frame
-                        self._frame_id += 1
-                        self._cached_image = None
+                    self._publish_frame(frame)
 
         except Exception as e:
             self._error_message = f"screenrecord 流错误: {e}，切换到截图模式"
@@ -406,14 +428,8 @@ class ScreenStreamer:
                                 expected_size = 12 + width * height * 4
                                 if len(frame_data) >= expected_size and width > 0 and height > 0:
                                     pixels = frame_data[12:12 + width * height * 4]
-                                    # RGBA -> RGB 转换并生成 JPEG
-                                    img = Image.frombytes('RGBA', (width, height), pixels)
-                                    img = img.convert('RGB')
-
                                     # 转为 JPEG 字节（比 PNG 更快）
-                                    buffer = io.BytesIO()
-                                    img.save(buffer, format='JPEG', quality=75)
-                                    frame_data = buffer.getvalue()
+                                    frame_data = _encode_rgba_jpeg(pixels, width, height)
                                 else:
                                     # 数据不完整，回退到 PNG 模式
                                     use_raw = False
@@ -435,10 +451,7 @@ class ScreenStreamer:
                             # PNG 解析失败，跳过此帧
                             continue
 
-                    with self._frame_lock:
-                        self._latest_frame = frame_data
-                        self._frame_id += 1
-                        self._cached_image = None
+                    self._publish_frame(frame_data)
 
                 # 控制帧率
                 elapsed = time.time() - start_time
@@ -475,10 +488,7 @@ class ScreenStreamer:
                 img.convert('RGB').save(buffer, format='JPEG', quality=75)
                 frame_bytes = buffer.getvalue()
 
-            with self._frame_lock:
-                self._latest_frame = frame_bytes
-                self._frame_id += 1
-                self._cached_image = None
+            self._publish_frame(frame_bytes)
 
             return True
         except Exception:
@@ -554,10 +564,33 @@ class ScreenStreamer:
             self._capture_thread.join(timeout=2)
 
         self._capture_thread = None
-        self._latest_frame = None
+        with self._frame_cond:
+            self._latest_frame = None
+            self._frame_cond.notify_all()
 
         return True, "实时流已停止"
 
+    def _publish_frame(self, frame: bytes):
+        """发布新帧并唤醒所有等待新帧的消费者"""
+        with self._frame_cond:
+            self._latest_frame = frame
+            self._frame_id += 1
+            self._cached_image = None  # 清除缓存
+            self._frame_cond.notify_all()
+
+    def wait_for_frame(self, last_frame_id: int, timeout: float = 1.0) -> bool:
+        """
+        阻塞等待帧ID超过 last_frame_id 的新帧
+
+        Returns:
+            超时前是否有新帧
+        """
+        with self._frame_cond:
+            return self._frame_cond.wait_for(
+                lambda: self._frame_id > last_frame_id or not self._running,
+                timeout=timeout,
+            ) and self._frame_id > last_frame_id
+
     def has_new_frame(self) -> bool:
         """检查是否有新帧（自上次获取后）"""
         with self._frame_lock:
@@ -606,6 +639,15 @@ class ScreenStreamer:
                 pass
         return None
 
+    def get_frame_snapshot(self) -> Tuple[int, Optional[bytes]]:
+        """
+        原子地获取 (帧ID, 帧字节)
+
+        帧字节是不可变的 bytes，多个观看者可直接共享同一对象发送，无需复制。
+        """
+        with self._frame_lock:
+            return self._frame_id, self._latest_frame
+
     def get_frame_bytes(self) -> Optional[bytes]:
         """获取最新帧的原始字节"""
         with self._frame_lock:
@@ -0,0 +1,166 @@
+"""测试助手规划模块的日志压缩、JSON 提取、分析缓存、批量任务分析和结果对象"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+pytest.importorskip("openai")
+
+from core import assistant_planner
+from core.assistant_planner import (
+    AssistantPlanner,
+    StructuredPlan,
+    TaskAnalysisResult,
+    _compact_logs,
+    _estimate_tokens,
+    _extract_json_object,
+)
+
+
+@pytest.fixture
+def planner():
+    return AssistantPlanner(api_base="http://localhost", api_key="test", model="test-model")
+
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(assistant_planner.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_estimate_tokens():
+    """测试：ASCII 约 4 字符/token，中文约 1 字/token"""
+    assert _estimate_tokens("") == 0
+    assert _estimate_tokens("abcd" * 10) == 10
+    assert _estimate_tokens("中文" * 5) == 10
+    assert _estimate_tokens("中文abcd") == 3
+
+
+def test_compact_logs_merges_repeated_lines():
+    """测试：连续重复行合并为一行并标注次数"""
+    logs = ["点击", "等待", "等待", "等待", "点击"]
+    assert _compact_logs(logs) == "点击\n等待 (×3)\n点击"
+
+
+def test_compact_logs_keeps_latest_lines_within_budget():
+    """测试：超出 token 预算时保留最新的完整行"""
+    logs = [f"step {i:02d} xxxx" for i in range(50)]
+    text = _compact_logs(logs, token_budget=20)
+
+    lines = text.split("\n")
+    assert lines[-1] == "step 49 xxxx"
+    assert set(lines) <= set(logs)
+    assert lines == logs[-len(lines):]
+    assert sum(_estimate_tokens(line) + 1 for line in lines) <= 20
+
+
+def test_compact_logs_truncates_single_oversized_line():
+    """测试：最新一行就超出预算时保留其末尾部分"""
+    text = _compact_logs(["x" * 100 + "END"], token_budget=10)
+    assert text == ("x" * 100 + "END")[-10:]
+
+
+@pytest.mark.parametrize("raw", [
+    '{"a": 1, "b": [1, 2]}',
+    '```json\n{"a": 1, "b": [1, 2]}\n```',
+    '```\n{"a": 1, "b": [1, 2]}\n```',
+    '分析结果如下：{"a": 1, "b": [1, 2]} 以上。',
+])
+def test_extract_json_object(raw):
+    """测试：兼容纯 JSON、markdown 代码块和前后多余文字"""
+    assert _extract_json_object(raw) == {"a": 1, "b": [1, 2]}
+
+
+def test_extract_json_object_invalid():
+    """测试：没有合法 JSON 时抛出异常"""
+    with pytest.raises(ValueError):
+        _extract_json_object("无法判断")
+
+
+def test_analysis_cache_expires_after_ttl(planner, clock):
+    """测试：缓存条目超过有效期后失效并被移除"""
+    result = TaskAnalysisResult(summary="ok")
+    planner._store_cached_analysis("key", result)
+
+    clock[0] += planner.ANALYSIS_CACHE_TTL
+    assert planner._get_cached_analysis("key") is result
+
+    clock[0] += 1
+    assert planner._get_cached_analysis("key") is None
+    assert "key" not in planner._analysis_cache
+
+
+def test_analysis_cache_evicts_least_recently_used(planner, clock, monkeypatch):
+    """测试：超出容量时淘汰最久未使用的条目，读取会刷新使用顺序"""
+    monkeypatch.setattr(AssistantPlanner, "ANALYSIS_CACHE_SIZE", 2)
+    planner._store_cached_analysis("a", TaskAnalysisResult(summary="a"))
+    planner._store_cached_analysis("b", TaskAnalysisResult(summary="b"))
+    assert planner._get_cached_analysis("a") is not None
+
+    planner._store_cached_analysis("c", TaskAnalysisResult(summary="c"))
+
+    assert planner._get_cached_analysis("b") is None
+    assert planner._get_cached_analysis("a").summary == "a"
+    assert planner._get_cached_analysis("c").summary == "c"
+
+
+def test_analysis_cache_key_depends_on_model(planner):
+    """测试：缓存键区分模型，相同输入得到相同的键"""
+    key = planner._analysis_cache_key("prompt")
+    assert key == planner._analysis_cache_key("prompt")
+    assert key != planner._analysis_cache_key("other")
+    planner.model = "another-model"
+    assert key != planner._analysis_cache_key("prompt")
+
+def test_analyze_task_executions_keeps_job_order(planner, monkeypatch):
+    """测试：批量分析并发执行每个任务，结果顺序与 jobs 一致"""
+    calls = []
+    threads = set()
+    lock = threading.Lock()
+
+    def fake_analyze(**job):
+        # 越靠前的任务完成得越晚，确保完成顺序与提交顺序相反
+        time.sleep(0.05 * (3 - job["index"]))
+        with lock:
+            calls.append(job["index"])
+            threads.add(threading.get_ident())
+        return f"result-{job['index']}"
+
+    monkeypatch.setattr(planner, "analyze_task_execution", fake_analyze)
+
+    results = planner.analyze_task_executions([{"index": i} for i in range(3)])
+
+    assert results == ["result-0", "result-1", "result-2"]
+    assert sorted(calls) == [0, 1, 2]
+    assert calls != [0, 1, 2]
+    assert len(threads) > 1
+
+
+def test_analyze_task_executions_empty_and_single(planner, monkeypatch):
+    """测试：空列表直接返回，单个任务在当前线程执行"""
+    caller = threading.get_ident()
+    monkeypatch.setattr(
+        planner, "analyze_task_execution", lambda **job: threading.get_ident()
+    )
+
+    assert planner.analyze_task_executions([]) == []
+    assert planner.analyze_task_executions([{}]) == [caller]
+
+
+def test_results_are_hashable_and_export_lists():
+    """测试：计划和分析结果可哈希，to_dict 仍输出列表"""
+    plan = StructuredPlan(task_description="打开微信", target_devices=("dev1",))
+    analysis = TaskAnalysisResult(issues_found=("问题",), strategy_suggestions=("建议",))
+
+    assert hash(plan) == hash(StructuredPlan(task_description="打开微信", target_devices=("dev1",)))
+    assert hash(analysis) == hash(TaskAnalysisResult(issues_found=("问题",), strategy_suggestions=("建议",)))
+    assert plan.to_dict()["target_devices"] == ["dev1"]
+    assert analysis.to_dict()["issues_found"] == ["问题"]
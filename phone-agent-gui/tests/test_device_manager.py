@@ -0,0 +1,80 @@
+"""测试设备管理器的 adb devices 解析和原始帧缓冲截图"""
+
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.device_manager import DeviceManager, _parse_adb_devices
+
+
+@pytest.fixture
+def manager():
+    """不依赖真实 ADB 和注册表文件的设备管理器"""
+    return DeviceManager(adb_helper=object(), device_registry=object())
+
+
+def _raw_frame(width, height, header_size, pixel_format=1):
+    """构造 screencap 原始输出：头部 + RGBA 像素"""
+    header = struct.pack("<III", width, height, pixel_format)
+    if header_size == 16:
+        header += struct.pack("<I", 0)  # colorspace
+    pixels = bytes(range(256)) * (width * height * 4 // 256 + 1)
+    return header + pixels[:width * height * 4]
+
+
+def test_parse_adb_devices():
+    """测试：解析 adb devices -l 输出，跳过标题行和空行"""
+    output = (
+        "List of devices attached\n"
+        "emulator-5554          device product:sdk model:Pixel_7 device:emu64\n"
+        "192.168.1.10:5555      offline\n"
+        "R58M123ABC             unauthorized usb:1-1 transport_id:3\n"
+        "\n"
+    )
+    assert _parse_adb_devices(output) == {
+        "emulator-5554": "device",
+        "192.168.1.10:5555": "offline",
+        "R58M123ABC": "unauthorized",
+    }
+
+
+def test_parse_adb_devices_empty():
+    """测试：没有设备时返回空字典"""
+    assert _parse_adb_devices("List of devices attached\n\n") == {}
+    assert _parse_adb_devices("") == {}
+
+
+@pytest.mark.parametrize("header_size", [12, 16])
+def test_take_screenshot_raw_header_sizes(manager, monkeypatch, header_size):
+    """测试：兼容 12 字节（旧版）和 16 字节（Android 9+）头部"""
+    data = _raw_frame(4, 3, header_size)
+    monkeypatch.setattr(manager, "_screencap", lambda device_id, command: (True, data))
+
+    success, frame = manager.take_screenshot_raw("dev1")
+
+    assert success
+    width, height, pixel_format, pixels = frame
+    assert (width, height, pixel_format) == (4, 3, 1)
+    assert bytes(pixels) == data[header_size:header_size + 4 * 3 * 4]
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\x00" * 8,
+    struct.pack("<III", 0, 3, 1),
+    _raw_frame(4, 3, 12)[:-1],
+])
+def test_take_screenshot_raw_rejects_bad_output(manager, monkeypatch, data):
+    """测试：输出过短、尺寸为 0 或像素不完整时返回失败"""
+    monkeypatch.setattr(manager, "_screencap", lambda device_id, command: (True, data))
+    assert manager.take_screenshot_raw("dev1") == (False, None)
+
+
+def test_take_screenshot_raw_screencap_failure(manager, monkeypatch):
+    """测试：截图命令失败时返回失败"""
+    monkeypatch.setattr(manager, "_screencap", lambda device_id, command: (False, b""))
+    assert manager.take_screenshot_raw("dev1") == (False, None)
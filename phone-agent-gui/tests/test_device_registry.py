@@ -0,0 +1,146 @@
+"""测试设备注册表的批量保存、原子写入和加载缓存"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core import device_registry
+from core.device_registry import DeviceRegistry, SavedDevice
+
+
+@pytest.fixture
+def registry_dir(tmp_path, monkeypatch):
+    """将注册表文件重定向到临时目录，并清空模块级加载缓存"""
+    monkeypatch.setattr(device_registry, "get_user_data_path", lambda: str(tmp_path))
+    monkeypatch.setattr(device_registry, "_load_cache", {})
+    return tmp_path
+
+
+@pytest.fixture
+def write_count(monkeypatch):
+    """统计 _atomic_write 的调用次数"""
+    calls = []
+    original = device_registry._atomic_write
+
+    def counting_write(path, payload):
+        calls.append(path)
+        original(path, payload)
+
+    monkeypatch.setattr(device_registry, "_atomic_write", counting_write)
+    return calls
+
+
+def test_batch_defers_save_until_exit(registry_dir, write_count):
+    """测试：batch() 块内的多次修改只在退出时写一次文件"""
+    registry = DeviceRegistry()
+
+    with registry.batch():
+        registry.add_or_update(SavedDevice(device_id="a", model="Pixel"))
+        registry.add_or_update(SavedDevice(device_id="b", model="Mate"))
+        registry.set_custom_name("a", "测试机")
+        assert write_count == []
+
+    assert len(write_count) == 1
+    assert DeviceRegistry().get("a").custom_name == "测试机"
+
+
+def test_nested_batch_saves_once(registry_dir, write_count):
+    """测试：嵌套 batch() 只在最外层退出时保存"""
+    registry = DeviceRegistry()
+
+    with registry.batch():
+        with registry.batch():
+            registry.add_or_update(SavedDevice(device_id="a"))
+        assert write_count == []
+
+    assert len(write_count) == 1
+
+
+def test_unchanged_save_is_skipped(registry_dir, write_count):
+    """测试：设备记录与上次写入相同时不再写文件"""
+    registry = DeviceRegistry()
+    registry.add_or_update(SavedDevice(device_id="a", model="Pixel"))
+    registry.save()
+
+    assert len(write_count) == 1
+
+
+def test_atomic_write_round_trip(registry_dir):
+    """测试：保存后重新加载内容一致，且不残留临时文件"""
+    registry = DeviceRegistry()
+    registry.add_or_update(SavedDevice(
+        device_id="192.168.1.100:5555",
+        custom_name="客厅平板",
+        device_type="wifi",
+        model="MatePad",
+        is_favorite=True,
+    ))
+
+    config_path = registry_dir / "config" / "devices.json"
+    assert config_path.exists()
+    assert not (registry_dir / "config" / "devices.json.tmp").exists()
+
+    with open(config_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["devices"][0]["custom_name"] == "客厅平板"
+
+    # 清空缓存，确保从文件重新解析
+    device_registry._load_cache.clear()
+    reloaded = DeviceRegistry().get("192.168.1.100:5555")
+    assert reloaded == registry.get("192.168.1.100:5555")
+    assert [d.device_id for d in DeviceRegistry().get_favorites()] == ["192.168.1.100:5555"]
+
+
+def _rewrite_devices(path, devices, size=None):
+    """模拟外部程序改写注册表文件，可用空格补齐到指定大小"""
+    payload = json.dumps({"devices": devices}).encode("utf-8")
+    if size is not None:
+        assert len(payload) <= size
+        payload += b" " * (size - len(payload))
+    with open(path, "wb") as f:
+        f.write(payload)
+
+
+def test_load_cache_invalidated_on_size_change(registry_dir):
+    """测试：文件大小变化后重新解析"""
+    registry = DeviceRegistry()
+    registry.add_or_update(SavedDevice(device_id="a", model="Pixel"))
+    config_path = registry._config_path
+
+    _rewrite_devices(config_path, [
+        {"device_id": "a", "model": "Pixel"},
+        {"device_id": "b", "model": "Mate"},
+    ])
+
+    assert {d.device_id for d in DeviceRegistry().get_all()} == {"a", "b"}
+
+
+def test_load_cache_invalidated_on_mtime_change(registry_dir):
+    """测试：文件大小不变但修改时间变化时重新解析"""
+    registry = DeviceRegistry()
+    registry.add_or_update(SavedDevice(device_id="a", model="AAAA"))
+    config_path = registry._config_path
+    original_size = os.path.getsize(config_path)
+    original_mtime = os.stat(config_path).st_mtime_ns
+
+    _rewrite_devices(config_path, [{"device_id": "a", "model": "BBBB"}], size=original_size)
+    os.utime(config_path, ns=(original_mtime + 1_000_000_000,) * 2)
+
+    assert os.path.getsize(config_path) == original_size
+    assert DeviceRegistry().get("a").model == "BBBB"
+
+
+def test_load_cache_reused_when_file_unchanged(registry_dir, monkeypatch):
+    """测试：文件未变化时复用解析结果，不再调用解析函数"""
+    registry = DeviceRegistry()
+    registry.add_or_update(SavedDevice(device_id="a"))
+
+    def fail_loads(data):
+        raise AssertionError("文件未变化时不应重新解析")
+
+    monkeypatch.setattr(device_registry, "_loads", fail_loads)
+    assert DeviceRegistry().get("a") is not None
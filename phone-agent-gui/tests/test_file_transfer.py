@@ -0,0 +1,100 @@
+"""测试文件传输管理器按目录合并推送时的逐文件结果判定"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.file_transfer import FileInfo, FileTransferManager, FileType
+
+
+class FakeADB:
+    """记录调用参数并返回预设结果的 ADBHelper 替身"""
+
+    def __init__(self, success, output):
+        self.result = (success, output)
+        self.calls = []
+
+    def run_command(self, args, timeout=None):
+        self.calls.append(args)
+        return self.result
+
+
+def _make_files(tmp_path, names):
+    infos = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b"data")
+        infos.append(FileInfo(
+            path=str(path),
+            name=name,
+            size=4,
+            file_type=FileType.IMAGE,
+            target_path=f"/sdcard/Pictures/{name}",
+        ))
+    return infos
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    """记录 _sync_and_scan 收到的已推送文件"""
+    calls = []
+    monkeypatch.setattr(
+        FileTransferManager, "_sync_and_scan",
+        lambda self, pushed, device_id=None: calls.append(pushed),
+    )
+    return calls
+
+
+def test_push_group_single_command(tmp_path, synced):
+    """测试：同一目录的多个文件合并为一次 adb push"""
+    infos = _make_files(tmp_path, ["a.jpg", "b.jpg"])
+    adb = FakeADB(True, "2 files pushed")
+    manager = FileTransferManager(adb)
+
+    results = manager._push_group(infos, "/sdcard/Pictures", "dev1")
+
+    assert len(adb.calls) == 1
+    assert adb.calls[0] == ["-s", "dev1", "push", infos[0].path, infos[1].path, "/sdcard/Pictures/"]
+    assert [r.success for r in results] == [True, True]
+    assert synced == [[(fi.target_path, fi.file_type) for fi in infos]]
+
+
+def test_push_group_marks_only_failed_file(tmp_path, synced):
+    """测试：adb 输出中点名的文件判为失败，其余文件仍判为成功"""
+    infos = _make_files(tmp_path, ["a.jpg", "b.jpg", "c.jpg"])
+    output = f"adb: error: failed to copy '{infos[1].path}' to '/sdcard/Pictures/b.jpg': No space left"
+    manager = FileTransferManager(FakeADB(False, output))
+
+    results = manager._push_group(infos, "/sdcard/Pictures", "dev1")
+
+    assert [r.success for r in results] == [True, False, True]
+    assert results[1].message == output
+    assert synced == [[(fi.target_path, fi.file_type) for fi in (infos[0], infos[2])]]
+
+
+def test_push_group_unattributed_failure_fails_all(tmp_path, synced):
+    """测试：失败输出无法对应到具体文件时，整组判为失败且不触发媒体扫描"""
+    infos = _make_files(tmp_path, ["a.jpg", "b.jpg"])
+    manager = FileTransferManager(FakeADB(False, "adb: error: device offline"))
+
+    results = manager._push_group(infos, "/sdcard/Pictures", "dev1")
+
+    assert [r.success for r in results] == [False, False]
+    assert synced == []
+
+
+def test_push_group_missing_local_file(tmp_path, synced):
+    """测试：本地不存在的文件不参与推送，直接判为失败"""
+    infos = _make_files(tmp_path, ["a.jpg", "b.jpg"])
+    os.remove(infos[0].path)
+    adb = FakeADB(True, "1 file pushed")
+    manager = FileTransferManager(adb)
+
+    results = manager._push_group(infos, "/sdcard/Pictures", "dev1")
+
+    assert adb.calls[0] == ["-s", "dev1", "push", infos[1].path, "/sdcard/Pictures/"]
+    assert [r.success for r in results] == [False, True]
+    assert results[0].message == "文件不存在"
@@ -0,0 +1,65 @@
+"""测试远程捕获常驻 shell 输出的 PNG 分帧读取"""
+
+import io
+import os
+import struct
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from core.remote_capture import _CAPTURE_END_MARKER, _PNG_SIGNATURE, _read_exact, _read_png_frame
+
+
+def _chunk(chunk_type, data):
+    crc = zlib.crc32(chunk_type + data)
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def _png(payload=b"\x00" * 16):
+    """构造分块结构完整的 PNG 字节（IDAT 内容不要求可解码）"""
+    ihdr = struct.pack(">IIBBBBB", 2, 2, 8, 6, 0, 0, 0)
+    return _PNG_SIGNATURE + _chunk(b"IHDR", ihdr) + _chunk(b"IDAT", payload) + _chunk(b"IEND", b"")
+
+
+def test_read_exact():
+    """测试：读取恰好 size 字节，不足时抛出 EOFError"""
+    stream = io.BytesIO(b"abcdef")
+    assert _read_exact(stream, 4) == b"abcd"
+    with pytest.raises(EOFError):
+        _read_exact(stream, 4)
+
+
+def test_read_png_frame_consumes_marker():
+    """测试：按分块长度读取整帧并消费结束标记，连续帧互不干扰"""
+    first = _png(b"\x01" * 32)
+    # IDAT 中包含换行和结束标记本身，分帧不能依赖搜索分隔符
+    second = _png(b"\n" + _CAPTURE_END_MARKER + b"\n")
+    stream = io.BytesIO(first + _CAPTURE_END_MARKER + b"\n" + second + _CAPTURE_END_MARKER + b"\n")
+
+    assert _read_png_frame(stream) == first
+    assert _read_png_frame(stream) == second
+    assert stream.read() == b""
+
+
+def test_read_png_frame_non_png_output():
+    """测试：screencap 输出错误信息时丢弃到结束标记并返回 None"""
+    stream = io.BytesIO(b"screencap: error\nmore text\n" + _CAPTURE_END_MARKER + b"\n" + b"next")
+    assert _read_png_frame(stream) is None
+    assert stream.read() == b"next"
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    _png()[:20],
+    _png(),  # 缺少结束标记
+    b"not a png\n",
+])
+def test_read_png_frame_eof(data):
+    """测试：shell 输出被截断时抛出 EOFError"""
+    with pytest.raises(EOFError):
+        _read_png_frame(io.BytesIO(data))
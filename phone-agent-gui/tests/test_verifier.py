@@ -0,0 +1,63 @@
+"""测试验证器的弹窗/错误关键词匹配"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from core.agent_v2.types import Observation, UIElement
+from core.agent_v2.verification.verifier import Verifier
+
+
+def _element(text="", content_desc=""):
+    return UIElement(
+        index=0, text=text, resource_id="", class_name="android.widget.TextView",
+        content_desc=content_desc, clickable=True, scrollable=False, enabled=True,
+        bounds=(0, 0, 100, 50),
+    )
+
+
+def _observation(*elements):
+    return Observation(timestamp=0.0, screenshot_base64="", ui_elements=list(elements))
+
+
+@pytest.mark.parametrize("keyword", Verifier.POPUP_KEYWORDS)
+def test_popup_re_matches_every_keyword(keyword):
+    """测试：合并后的弹窗正则覆盖每个关键词"""
+    assert Verifier._POPUP_RE.search(f"前缀{keyword}后缀")
+
+
+@pytest.mark.parametrize("keyword", Verifier.ERROR_KEYWORDS)
+def test_error_re_matches_every_keyword(keyword):
+    """测试：合并后的错误正则覆盖每个关键词"""
+    assert Verifier._ERROR_RE.search(f"前缀{keyword}后缀")
+
+
+def test_keyword_regex_escapes_special_characters():
+    """测试：关键词按字面匹配，"Re-login" 中的连字符不会被当作正则语法"""
+    assert Verifier._ERROR_RE.search("Re-login")
+    assert not Verifier._ERROR_RE.search("Relogin")
+
+
+def test_detect_popup_and_error():
+    """测试：在元素文本和描述中检测弹窗、错误状态"""
+    verifier = Verifier()
+    popup = _observation(_element("是否允许访问位置信息"))
+    error = _observation(_element(content_desc="网络错误，请重试"))
+    plain = _observation(_element("首页"), _element("消息"))
+
+    assert verifier._detect_popup(popup)
+    assert not verifier._detect_error(popup)
+    assert verifier._detect_error(error)
+    assert not verifier._detect_popup(plain)
+    assert not verifier._detect_error(plain)
+
+
+def test_scan_elements_does_not_match_across_elements():
+    """测试：关键词不会跨越两个元素的文本拼接匹配"""
+    observation = _observation(_element("Can"), _element("cel"))
+    assert not Verifier._scan_elements(observation, Verifier._POPUP_RE)
@@ -235,8 +235,8 @@ class AppState:
 
         # 如果没有指定设备，默认选择所有在线设备（不使用 current_device）
         if not target_list:
-            online_devices = self.device_manager.scan_devices(include_saved_offline=False)
-            target_list = [d.device_id for d in online_devices if d.is_online]
+            online_devices = self.device_manager.scan_devices(online_only=True)
+            target_list = [d.device_id for d in online_devices]
             if not target_list:
                 return {"success": False, "message": "没有在线设备，请先连接设备"}
 
@@ -373,8 +373,8 @@ class AppState:
         # 确定设备
         targets = device_ids or []
         if not targets:
-            devices = self.device_manager.scan_devices(include_saved_offline=False)
-            targets = [d.device_id for d in devices if d.is_online]
+            devices = self.device_manager.scan_devices(online_only=True)
+            targets = [d.device_id for d in devices]
 
         job = scheduler.add_job({
             "description": task_description,